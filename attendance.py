@@ -1,9 +1,9 @@
 from datetime import datetime
-from database import Database
+from database import get_database
 
 class AttendanceSystem:
     def __init__(self):
-        self.db = Database()
+        self.db = get_database()
     
     def mark_attendance(self, emp_id, manual_override=False):
         current_date = datetime.now().strftime("%Y-%m-%d")
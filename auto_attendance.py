@@ -0,0 +1,143 @@
+import logging
+import queue
+import threading
+import time
+from config import Config
+from detector import FaceDetector
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def box_iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    intersection = ix * iy
+    union = aw * ah + bw * bh - intersection
+    return intersection / union if union else 0.0
+
+
+class FaceTrack:
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = box
+        self.missed = 0
+        self.student = None  # Set once the track has been matched, so it is never matched again
+
+
+class FaceTracker:
+    """Greedy IoU tracker that keeps identities of faces between processed frames."""
+
+    def __init__(self, iou_threshold=Config.AUTO_TRACK_IOU, max_missed=Config.AUTO_TRACK_MAX_MISSED):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.tracks = {}
+        self._next_id = 1
+
+    def update(self, boxes):
+        """Assign detections to tracks and return the list of tracks seen in this frame."""
+        candidates = sorted(
+            ((box_iou(track.box, box), track_id, index)
+             for track_id, track in self.tracks.items()
+             for index, box in enumerate(boxes)),
+            reverse=True,
+        )
+
+        seen = []
+        used_tracks = set()
+        used_boxes = set()
+        for iou, track_id, index in candidates:
+            if iou < self.iou_threshold:
+                break
+            if track_id in used_tracks or index in used_boxes:
+                continue
+            track = self.tracks[track_id]
+            track.box = boxes[index]
+            track.missed = 0
+            used_tracks.add(track_id)
+            used_boxes.add(index)
+            seen.append(track)
+
+        for track_id in list(self.tracks):
+            if track_id not in used_tracks:
+                self.tracks[track_id].missed += 1
+                if self.tracks[track_id].missed > self.max_missed:
+                    del self.tracks[track_id]
+
+        for index, box in enumerate(boxes):
+            if index not in used_boxes:
+                track = FaceTrack(self._next_id, box)
+                self._next_id += 1
+                self.tracks[track.track_id] = track
+                seen.append(track)
+
+        return seen
+
+
+class ContinuousRecognizer(threading.Thread):
+    """Hands-free attendance: detects and matches every face on every Nth camera frame.
+
+    Matches are put on self.results as (student, distance) tuples; the Tk thread drains the
+    queue, marks attendance and refreshes the face index, so this thread only matches. clock
+    times the cooldown; the replay harness passes a simulated one.
+    """
+
+    def __init__(self, frame_grabber, face_index, every_n_frames=Config.AUTO_EVERY_N_FRAMES,
+                 cooldown=Config.AUTO_MARK_COOLDOWN, clock=time.monotonic):
+        super().__init__(daemon=True)
+        self.frame_grabber = frame_grabber
+        self.face_index = face_index
+        self.every_n_frames = max(1, every_n_frames)
+        self.cooldown = cooldown  # Seconds before the same student can be reported again
+        self.results = queue.Queue()
+        self.tracker = FaceTracker()
+        self._last_reported = {}  # student_id -> clock() of the last report
+        self.clock = clock
+        self.face_detector = FaceDetector()  # Owned by this thread; tracks ROIs between frames
+        self._stop_event = threading.Event()
+
+    def run(self):
+        last_seq = 0
+        while not self._stop_event.is_set():
+            seq, frame, _ = self.frame_grabber.latest.get()
+            if frame is None or seq - last_seq < self.every_n_frames:
+                self._stop_event.wait(0.01)
+                continue
+            if last_seq and seq - last_seq > self.every_n_frames:
+                # Frames we meant to process went by while the previous one was still running
+                metrics.incr("frames_dropped", (seq - last_seq) // self.every_n_frames - 1)
+            last_seq = seq
+            try:
+                self.process_frame(frame)
+            except Exception:
+                logger.exception("Error in continuous recognition")
+
+    def process_frame(self, frame):
+        boxes = self.face_detector.detect(frame, use_roi=True)
+        pending = [track for track in self.tracker.update(boxes) if track.student is None]
+        if not pending:
+            return
+
+        pending_boxes = [track.box for track in pending]
+        crops = [frame[y:y + h, x:x + w] for (x, y, w, h) in pending_boxes]
+        matches = self.face_index.best_matches(crops, refresh=False, boxes=pending_boxes)
+
+        now = self.clock()
+        for track, (student, distance) in zip(pending, matches):
+            if student is None:
+                metrics.incr("faces_unmatched")
+                continue
+            metrics.incr("faces_matched")
+            track.student = student
+            last = self._last_reported.get(student[2])
+            if last is not None and now - last < self.cooldown:
+                continue
+            self._last_reported[student[2]] = now
+            self.results.put((student, distance))
+
+    def stop(self, timeout=1.0):
+        self._stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
@@ -0,0 +1,318 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+import cv2
+import numpy as np
+from config import Config
+from database import Database
+from detector import FaceDetector
+from face_index import TEMPLATE_MODEL, face_hashes
+from face_utils import FaceRecognizer
+from template_index import HASH_BYTES, create_index
+
+# Component benchmarks: face detection, hashing, matching and database writes/reports, each
+# timed on its own. Uses the images in faces/ and photos/ plus synthetic augmentations, and
+# scales enrollments and attendance tables synthetically. Results go to a JSON file;
+# `compare` flags stages that got slower between two runs.
+#
+#   python benchmark.py run --output bench.json
+#   python benchmark.py compare old.json new.json
+
+IMAGE_DIRS = ("faces", "photos")
+
+
+def measure(fn, repeat=20, warmup=2, ops=1):
+    """Time fn() repeat times; returns summary stats in milliseconds per call (and per op)."""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    median = statistics.median(times)
+    return {
+        'repeat': repeat,
+        'ops': ops,
+        'mean_ms': statistics.fmean(times),
+        'median_ms': median,
+        'p95_ms': times[min(len(times) - 1, int(len(times) * 0.95))],
+        'ops_per_sec': ops * 1000 / median if median else None,
+    }
+
+
+def load_images():
+    images = []
+    for folder in IMAGE_DIRS:
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            if os.path.splitext(name)[1].lower() in Config.PHOTO_EXTENSIONS:
+                image = cv2.imread(os.path.join(folder, name))
+                if image is not None:
+                    images.append(image)
+    if not images:
+        raise SystemExit(f"No images found in {', '.join(IMAGE_DIRS)}")
+    return images
+
+
+def augment(image, rng):
+    """A randomly flipped, shifted, rotated, relit and noisy copy of image."""
+    height, width = image.shape[:2]
+    if rng.random() < 0.5:
+        image = cv2.flip(image, 1)
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), rng.uniform(-8, 8), rng.uniform(0.95, 1.05))
+    matrix[:, 2] += rng.uniform(-10, 10, 2)
+    image = cv2.warpAffine(image, matrix, (width, height), borderMode=cv2.BORDER_REFLECT)
+    image = cv2.convertScaleAbs(image, alpha=rng.uniform(0.8, 1.2), beta=rng.uniform(-20, 20))
+    noise = rng.normal(0, 4, image.shape)
+    return np.clip(image + noise, 0, 255).astype(np.uint8)
+
+
+def face_crops(images, detector):
+    crops = []
+    for image in images:
+        boxes = detector.detect(image)
+        crops.extend(image[y:y + h, x:x + w] for (x, y, w, h) in boxes)
+    return crops or [cv2.resize(image, (160, 160)) for image in images]
+
+
+def synthetic_templates(base, count, rng, flip_bits=12):
+    """count hashes made by flipping random bits of the real face hashes in base."""
+    templates = base[rng.integers(0, len(base), count)].copy()
+    bits = np.unpackbits(templates, axis=1)
+    flips = rng.random(bits.shape) < flip_bits / (HASH_BYTES * 8)
+    return np.packbits(bits ^ flips, axis=1)
+
+
+def bench_detection(results, images, rng, widths, args):
+    frames = [augment(image, rng) for image in images for _ in range(4)]
+    for width in widths:
+        scaled = [cv2.resize(frame, (width, int(frame.shape[0] * width / frame.shape[1]))) for frame in frames]
+        for detect_width in sorted({min(width, Config.DETECT_WIDTH), width}):
+            detector = FaceDetector(scale_factor=args.scale_factor, min_neighbors=args.min_neighbors,
+                                    detect_width=detect_width)
+            cycle = iter(scaled * 1000)
+            stats = measure(lambda: detector.detect(next(cycle)), repeat=args.repeat)
+            # Faces found across the sample frames, to weigh speed against missed faces when tuning
+            stats['faces'] = sum(len(detector.detect(frame)) for frame in scaled)
+            stats['frames'] = len(scaled)
+            results[f"detect/frame{width}/at{detect_width}"] = stats
+
+
+def bench_hashing(results, crops, args):
+    results["hash/1"] = measure(lambda: face_hashes(crops[:1]), repeat=args.repeat * 5)
+    batch = (crops * 32)[:32]
+    results["hash/batch32"] = measure(lambda: face_hashes(batch), repeat=args.repeat, ops=len(batch))
+
+
+def bench_matching(results, crops, rng, student_counts, args, workdir):
+    base = face_hashes(crops)
+    probes = synthetic_templates(base, 64, rng, flip_bits=4)
+    for count in student_counts:
+        templates = synthetic_templates(base, count, rng)
+        keys = [f"S{i}" for i in range(count)]
+        for backend in args.backends:
+            index = create_index(backend)
+            start = time.perf_counter()
+            index.add_many(keys, templates)
+            build_ms = (time.perf_counter() - start) * 1000
+            single = measure(lambda: index.search(probes[:1], 1, Config.FACE_MATCH_THRESHOLD), repeat=args.repeat)
+            single['build_ms'] = build_ms
+            results[f"match/{backend}/{count}/probe1"] = single
+            results[f"match/{backend}/{count}/batch64"] = measure(
+                lambda: index.search(probes, 1, Config.FACE_MATCH_THRESHOLD), repeat=max(3, args.repeat // 4),
+                ops=len(probes))
+            del index
+
+        # compare_captured_face: FaceRecognizer on one face crop against every enrolled student
+        db = Database(os.path.join(workdir, f"match_{count}.db"))
+        db.add_students([(f"Student {i}", key, None, f"C{i % 20}", template.tobytes(), TEMPLATE_MODEL)
+                         for i, (key, template) in enumerate(zip(keys, templates))])
+        recognizer = FaceRecognizer(db)
+        cache = recognizer.face_index.cache
+        recognizer.face_index.cache = None
+        crop = crops[0]
+        results[f"compare_captured_face/{count}"] = measure(
+            lambda: recognizer.recognize([crop], detect=False, refresh=False), repeat=args.repeat)
+        results[f"compare_captured_face/{count}/refresh"] = measure(
+            lambda: recognizer.recognize([crop], detect=False), repeat=args.repeat)
+
+        # The same face over consecutive frames: sensor noise only, answered by the probe cache
+        if cache is not None:
+            recognizer.face_index.cache = cache
+            frames = [np.clip(crop + rng.normal(0, 2, crop.shape), 0, 255).astype(np.uint8)
+                      for _ in range(args.repeat + 2)]
+            cycle = iter(frames * 1000)
+            stats = measure(lambda: recognizer.recognize([next(cycle)], detect=False, refresh=False),
+                            repeat=args.repeat)
+            stats['hit_rate'] = cache.stats()['hit_rate']
+            results[f"compare_captured_face/{count}/probe_cache"] = stats
+        db.close()
+
+
+def fill_attendance(db, rows, students=1000):
+    """Insert rows synthetic attendance marks spread over students and consecutive days."""
+    db.add_students([(f"Student {i}", f"S{i}", None, f"C{i % 20}", None, None) for i in range(students)])
+    days = -(-rows // students)
+    first_day = date(2020, 1, 1)
+    batch = []
+    for day in range(days):
+        day_text = (first_day + timedelta(days=day)).isoformat()
+        for i in range(min(students, rows - day * students)):
+            batch.append((f"S{i}", day_text, f"{7 + i % 3:02d}:{i % 60:02d}:00"))
+        if len(batch) >= 100_000:
+            db.conn.executemany("INSERT INTO attendance (student_id, attendance_date, time_in) VALUES (?, ?, ?)", batch)
+            batch = []
+    db.conn.executemany("INSERT INTO attendance (student_id, attendance_date, time_in) VALUES (?, ?, ?)", batch)
+    db.conn.commit()
+    return first_day, first_day + timedelta(days=days - 1), students
+
+
+def bench_database(results, row_counts, args, workdir):
+    for rows in row_counts:
+        for write_behind in (False, True):
+            db = Database(os.path.join(workdir, f"attendance_{rows}_{int(write_behind)}.db"), write_behind=write_behind)
+            first_day, last_day, students = fill_attendance(db, rows)
+            mode = "write_behind" if write_behind else "direct"
+
+            # New marks go to the enrolled students on the days after the synthetic history
+            counter = iter(range(10_000_000))
+
+            def mark():
+                n = next(counter)
+                day = (last_day + timedelta(days=1 + n // students)).isoformat()
+                db.mark_attendance(f"S{n % students}", day, "08:30:00")
+
+            stats = measure(mark, repeat=args.repeat * 10)
+            start = time.perf_counter()
+            db.flush_attendance()
+            stats['flush_ms'] = (time.perf_counter() - start) * 1000
+            results[f"db/{rows}/mark_attendance/{mode}"] = stats
+            if write_behind:
+                db.close()
+                continue
+
+            first, last = first_day.isoformat(), last_day.isoformat()
+            month_end = min(first_day + timedelta(days=30), last_day).isoformat()
+            results[f"db/{rows}/report/month"] = measure(
+                lambda: db.get_attendance_report(first, month_end), repeat=max(3, args.repeat // 4))
+            results[f"db/{rows}/report/all"] = measure(
+                lambda: db.get_attendance_report(first, last), repeat=3, warmup=1, ops=rows)
+            results[f"db/{rows}/report/stream_all"] = measure(
+                lambda: sum(len(batch) for batch in db.iter_attendance_report(first, last)),
+                repeat=3, warmup=1, ops=rows)
+            results[f"db/{rows}/report/first_page"] = measure(
+                lambda: db.get_attendance_report_page(first, last), repeat=args.repeat)
+            results[f"db/{rows}/class_daily_totals"] = measure(
+                lambda: db.get_class_daily_totals(first, last), repeat=args.repeat)
+            db.close()
+
+
+def run(args):
+    rng = np.random.default_rng(args.seed)
+    cv2.setRNGSeed(args.seed)
+    images = load_images()
+    samples = [augment(image, rng) for image in images for _ in range(8)]
+    crops = face_crops(images + samples, FaceDetector())
+
+    results = {}
+    stages = set(args.stages)
+    if "detect" in stages:
+        bench_detection(results, images, rng, args.widths, args)
+    if "hash" in stages:
+        bench_hashing(results, crops, args)
+    workdir = tempfile.mkdtemp(prefix="attendance_bench_")
+    try:
+        if "match" in stages:
+            bench_matching(results, crops, rng, args.students, args, workdir)
+        if "db" in stages:
+            bench_database(results, args.rows, args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'time': datetime.now().isoformat(timespec="seconds"),
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'args': {key: value for key, value in vars(args).items() if key != "func"},
+        },
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    for name, stats in results.items():
+        print(f"{name:45s} {stats['median_ms']:10.3f} ms  (p95 {stats['p95_ms']:.3f})")
+    print(f"Results written to {args.output}")
+
+
+def compare(args):
+    """Print the change in median time per benchmark; exit 1 if any got slower than tolerance."""
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+    with open(args.current, encoding='utf-8') as f:
+        current = json.load(f)['results']
+
+    regressions = []
+    for name in sorted(set(baseline) | set(current)):
+        if name not in baseline or name not in current:
+            print(f"{name:45s} {'only in ' + ('current' if name in current else 'baseline'):>30s}")
+            continue
+        old, new = baseline[name]['median_ms'], current[name]['median_ms']
+        change = (new - old) / old if old else 0.0
+        flag = ""
+        if change > args.tolerance and new - old > args.min_delta:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change < -args.tolerance:
+            flag = "  faster"
+        print(f"{name:45s} {old:10.3f} -> {new:10.3f} ms  {change:+7.1%}{flag}")
+
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.tolerance:.0%}")
+        sys.exit(1)
+    print("No regressions")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark detection, hashing, matching and database stages")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmarks and write a JSON report")
+    run_parser.add_argument("--output", default="benchmark.json")
+    run_parser.add_argument("--stages", nargs="+", default=["detect", "hash", "match", "db"],
+                            choices=["detect", "hash", "match", "db"])
+    run_parser.add_argument("--widths", type=int, nargs="+", default=[320, 640, 1280], help="Frame widths for detection")
+    run_parser.add_argument("--scale-factor", type=float, default=Config.DETECT_SCALE_FACTOR)
+    run_parser.add_argument("--min-neighbors", type=int, default=Config.DETECT_MIN_NEIGHBORS)
+    run_parser.add_argument("--students", type=int, nargs="+", default=[1_000, 10_000, 100_000],
+                            help="Enrollment sizes for the matchers")
+    run_parser.add_argument("--backends", nargs="+", default=["brute", "mih", "sharded"], help="Face index backends to time")
+    run_parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000],
+                            help="Attendance table sizes (e.g. add 1000000)")
+    run_parser.add_argument("--repeat", type=int, default=20, help="Timed calls per benchmark")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.set_defaults(func=run)
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two JSON reports")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--tolerance", type=float, default=0.10, help="Slowdown that counts as a regression")
+    compare_parser.add_argument("--min-delta", type=float, default=0.05,
+                                help="Ignore slowdowns smaller than this many milliseconds (timer noise)")
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
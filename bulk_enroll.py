@@ -0,0 +1,177 @@
+import argparse
+import csv
+import logging
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Bulk enrollment from a roster CSV and a folder of photos. The roster is read in batches;
+# each batch has its photos checked and hashed in a process pool and is then inserted in
+# one transaction, so thousands of students enroll in minutes and memory stays flat.
+#
+# Roster rows are "student_id,name[,class]", with or without a header row. A student's
+# photo is <student_id>.<ext> or <student_id>_<anything>.<ext> in the photo folder.
+
+REJECT_HEADER = ["Line", "Student ID", "Name", "Reason"]
+
+
+def read_roster(path):
+    """Yield (line_number, student_id, name, class) for every row of a roster CSV."""
+    with open(path, newline='', encoding='utf-8-sig') as csvfile:
+        columns = (0, 1, 2)
+        for line_number, row in enumerate(csv.reader(csvfile), start=1):
+            cells = [cell.strip() for cell in row]
+            if not any(cells):
+                continue
+            if line_number == 1 and "name" in [cell.lower() for cell in cells]:
+                header = [cell.lower().replace(" ", "_") for cell in cells]
+                id_column = next((header.index(c) for c in ("student_id", "id") if c in header), 0)
+                class_column = header.index("class") if "class" in header else None
+                columns = (id_column, header.index("name"), class_column)
+                continue
+            student_id, name, student_class = (
+                cells[column] if column is not None and column < len(cells) else ""
+                for column in columns)
+            yield line_number, student_id, name, student_class or None
+
+
+def find_photos(photo_dir):
+    """Map student ID to photo path for every image in photo_dir."""
+    photos = {}
+    for entry in os.scandir(photo_dir):
+        stem, ext = os.path.splitext(entry.name)
+        if entry.is_file() and ext.lower() in Config.PHOTO_EXTENSIONS:
+            # "<id>.jpg" wins over "<id>_<name>.jpg" when both exist
+            student_id = stem.split("_", 1)[0]
+            if student_id not in photos or stem == student_id:
+                photos[student_id] = entry.path
+    return photos
+
+
+def _enroll_worker(job):
+    # Runs in a pool process: check the photo and its quality, hash the face and copy it into faces_dir
+    student_id, photo_path, face_path = job
+    import cv2
+    from face_index import enrollment_detector, face_hash
+    from face_quality import face_quality
+
+    image = cv2.imread(photo_path)
+    if image is None:
+        return student_id, None, "unreadable image"
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    faces = enrollment_detector().detect(gray)
+    if not faces:
+        return student_id, None, "no face"
+    if len(faces) > 1:
+        return student_id, None, "multiple faces"
+
+    quality = face_quality(gray, faces[0])
+    if not quality['passed']:
+        return student_id, None, f"low quality: {', '.join(quality['issues'])}"
+
+    x, y, w, h = faces[0]
+    template = face_hash(gray[y:y + h, x:x + w]).tobytes()
+    if os.path.splitext(photo_path)[1].lower() in ('.jpg', '.jpeg'):
+        shutil.copyfile(photo_path, face_path)
+    else:
+        cv2.imwrite(face_path, image)
+    return student_id, template, None
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def enroll_roster(db, roster_path, photo_dir, faces_dir="faces", workers=None,
+                  batch_size=Config.ENROLL_BATCH_SIZE, default_class=None):
+    """Enroll every student in a roster, returns (enrolled_count, rejects).
+
+    rejects is a list of (line_number, student_id, name, reason) for rows that were skipped:
+    missing fields, duplicate or already enrolled IDs, missing or unreadable photos, photos
+    with no face or more than one, and faces failing the quality gate.
+    """
+    from face_index import TEMPLATE_MODEL
+
+    os.makedirs(faces_dir, exist_ok=True)
+    photos = find_photos(photo_dir)
+    seen = db.get_student_ids()
+    enrolled = 0
+    rejects = []
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for batch in _batches(read_roster(roster_path), batch_size):
+            pending = []
+            for line_number, student_id, name, student_class in batch:
+                if not student_id or not name:
+                    reason = "missing student ID or name"
+                elif student_id in seen:
+                    reason = "duplicate student ID"
+                elif student_id not in photos:
+                    reason = "no photo"
+                else:
+                    seen.add(student_id)
+                    face_path = os.path.join(faces_dir, f"{student_id}.jpg")
+                    pending.append((line_number, student_id, name, student_class or default_class, face_path))
+                    continue
+                rejects.append((line_number, student_id, name, reason))
+
+            jobs = [(student_id, photos[student_id], face_path) for _, student_id, _, _, face_path in pending]
+            chunksize = max(1, len(jobs) // (workers * 4))
+            rows = []
+            for (line_number, student_id, name, student_class, face_path), (_, template, reason) in zip(
+                    pending, executor.map(_enroll_worker, jobs, chunksize=chunksize)):
+                if reason is not None:
+                    rejects.append((line_number, student_id, name, reason))
+                else:
+                    rows.append((name, student_id, face_path, student_class, template, TEMPLATE_MODEL))
+            if rows:
+                enrolled += db.add_students(rows)
+            logger.info("Enrolled %d students, %d rejected so far", enrolled, len(rejects))
+    rejects.sort()
+    return enrolled, rejects
+
+
+def write_rejects(path, rejects):
+    with open(path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(REJECT_HEADER)
+        writer.writerows(rejects)
+
+
+if __name__ == '__main__':
+    from database import Database
+
+    parser = argparse.ArgumentParser(description="Enroll students in bulk from a roster CSV and a photo folder")
+    parser.add_argument("roster", help="CSV of student_id,name[,class] rows")
+    parser.add_argument("photos", help="Folder of <student_id>[_name].jpg photos")
+    parser.add_argument("--db", default="attendance_system.db", help="Path to the SQLite database")
+    parser.add_argument("--faces-dir", default="faces", help="Where enrolled face images are stored")
+    parser.add_argument("--class", dest="student_class", default=None, help="Class for rows that have none")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--batch-size", type=int, default=Config.ENROLL_BATCH_SIZE, help="Students per transaction")
+    parser.add_argument("--rejects", default="enroll_rejects.csv", help="CSV report of skipped rows")
+    args = parser.parse_args()
+    logging.basicConfig(level=Config.LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    logger.setLevel(logging.INFO)  # Batch progress
+
+    db = Database(args.db)
+    try:
+        enrolled, rejects = enroll_roster(db, args.roster, args.photos, args.faces_dir, args.workers,
+                                          args.batch_size, args.student_class)
+    finally:
+        db.close()
+    print(f"Enrolled {enrolled} students.")
+    if rejects:
+        write_rejects(args.rejects, rejects)
+        print(f"{len(rejects)} rows rejected, see {args.rejects}")
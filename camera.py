@@ -0,0 +1,231 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+import cv2
+from PIL import Image
+from config import Config
+from metrics import metrics
+
+
+class ImageFolderCapture:
+    """cv2.VideoCapture stand-in that plays the images in a folder, looping by default.
+
+    Lets the camera pipeline run against folders like faces/ without a camera attached;
+    fps=None serves frames as fast as they are read.
+    """
+
+    def __init__(self, folder, fps=None, loop=True):
+        self.paths = sorted(os.path.join(folder, name) for name in os.listdir(folder)
+                            if os.path.splitext(name)[1].lower() in Config.PHOTO_EXTENSIONS)
+        self.fps = fps
+        self.loop = loop
+        self._frames = {}  # Decoded once, the folder is meant to be small
+        self._position = 0
+        self._next_time = time.monotonic()
+
+    def isOpened(self):
+        return bool(self.paths)
+
+    def read(self):
+        if not self.paths or (self._position >= len(self.paths) and not self.loop):
+            return False, None
+        if self.fps:
+            delay = self._next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._next_time = max(self._next_time, time.monotonic() - 1.0) + 1.0 / self.fps
+        path = self.paths[self._position % len(self.paths)]
+        self._position += 1
+        frame = self._frames.get(path)
+        if frame is None:
+            frame = self._frames[path] = cv2.imread(path)
+        return frame is not None, frame
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self._position = int(value)
+            return True
+        return False
+
+    def release(self):
+        self._frames = {}
+
+
+def open_capture(source, fps=None):
+    """Open a camera index, video file, stream URL or image folder as a VideoCapture-like object."""
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    if isinstance(source, str) and os.path.isdir(source):
+        return ImageFolderCapture(source, fps=fps)
+    return cv2.VideoCapture(source)
+
+
+class LatestFrame:
+    """Single-slot frame buffer: each new frame replaces the previous one, stale frames are dropped."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._frame = None
+        self._image = None
+
+    def put(self, frame, image):
+        with self._lock:
+            self._frame = frame
+            self._image = image
+            self._seq += 1
+
+    def get(self):
+        # Returns (sequence number, BGR frame, RGB PIL image); seq only grows so readers can skip repeats
+        with self._lock:
+            return self._seq, self._frame, self._image
+
+
+class FrameGrabber(threading.Thread):
+    """Reads frames from a cv2.VideoCapture and converts them for display off the Tk main thread."""
+
+    def __init__(self, video_capture, retry_delay=0.05):
+        super().__init__(daemon=True)
+        self.video_capture = video_capture
+        self.retry_delay = retry_delay
+        self.latest = LatestFrame()
+        self._stop_event = threading.Event()
+        self._bursts = []  # (future, frames, count, deadline) requested by grab_burst
+        self._bursts_lock = threading.Lock()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            with metrics.timer("capture"):
+                ret, frame = self.video_capture.read()
+            if not ret:
+                # Camera hiccup or unplugged; back off instead of spinning
+                metrics.incr("capture_failures")
+                self._collect_bursts(None)
+                self._stop_event.wait(self.retry_delay)
+                continue
+            metrics.incr("frames_captured")
+            image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            self.latest.put(frame, image)
+            self._collect_bursts(frame)
+        self._collect_bursts(None, finish=True)
+
+    def stop(self, timeout=1.0):
+        self._stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+
+    def grab_burst(self, count, timeout=1.0):
+        """Future of the next count consecutive frames, collected on the grabber thread.
+
+        It resolves with a shorter (possibly empty) list if timeout seconds pass first or the
+        grabber stops, so the Tk thread can poll it instead of waiting for the camera.
+        """
+        future = Future()
+        with self._bursts_lock:
+            if self._stop_event.is_set():
+                future.set_result([])
+            else:
+                self._bursts.append((future, [], count, time.monotonic() + timeout))
+        return future
+
+    def _collect_bursts(self, frame, finish=False):
+        if not self._bursts:
+            return
+        now = time.monotonic()
+        with self._bursts_lock:
+            pending = []
+            for burst in self._bursts:
+                future, frames, count, deadline = burst
+                if frame is not None:
+                    frames.append(frame)
+                if finish or len(frames) >= count or now >= deadline:
+                    future.set_result(frames)
+                else:
+                    pending.append(burst)
+            self._bursts = pending
+
+
+class CameraManager:
+    """Keeps one camera open across screens; subscribers are reference counted and the
+    device is released only after it has been idle for idle_timeout seconds."""
+
+    def __init__(self, device_index=Config.CAMERA_INDEX, width=Config.CAMERA_WIDTH,
+                 height=Config.CAMERA_HEIGHT, fps=Config.CAMERA_FPS,
+                 idle_timeout=Config.CAMERA_IDLE_TIMEOUT):
+        self.device_index = device_index
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.idle_timeout = idle_timeout  # None keeps the camera open until close()
+        self.video_capture = None
+        self.grabber = None
+        self._subscribers = 0
+        self._idle_timer = None
+        self._lock = threading.Lock()
+
+    @property
+    def subscribers(self):
+        return self._subscribers
+
+    def is_open(self):
+        return self.grabber is not None
+
+    def subscribe(self):
+        """Register a consumer, opening the camera if needed; returns the shared FrameGrabber."""
+        with self._lock:
+            self._cancel_idle_timer()
+            if self.grabber is None:
+                self._open()
+            self._subscribers += 1
+            return self.grabber
+
+    def unsubscribe(self):
+        with self._lock:
+            if self._subscribers == 0:
+                return
+            self._subscribers -= 1
+            if self._subscribers == 0 and self.idle_timeout is not None:
+                if self.idle_timeout <= 0:
+                    self._close()
+                else:
+                    self._idle_timer = threading.Timer(self.idle_timeout, self._close_if_idle)
+                    self._idle_timer.daemon = True
+                    self._idle_timer.start()
+
+    def close(self):
+        with self._lock:
+            self._cancel_idle_timer()
+            self._subscribers = 0
+            self._close()
+
+    def _open(self):
+        video_capture = open_capture(self.device_index)
+        if self.width:
+            video_capture.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        if self.height:
+            video_capture.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        if self.fps:
+            video_capture.set(cv2.CAP_PROP_FPS, self.fps)
+        self.video_capture = video_capture
+        self.grabber = FrameGrabber(video_capture)
+        self.grabber.start()
+
+    def _close(self):
+        if self.grabber is not None:
+            self.grabber.stop()
+            self.grabber = None
+        if self.video_capture is not None:
+            self.video_capture.release()
+            self.video_capture = None
+
+    def _close_if_idle(self):
+        with self._lock:
+            self._idle_timer = None
+            if self._subscribers == 0:
+                self._close()
+
+    def _cancel_idle_timer(self):
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
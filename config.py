@@ -5,4 +5,96 @@ BASE_DIR = Path(__file__).resolve().parent
 
 class Config:
     DATABASE_PATH = os.path.join(BASE_DIR, 'attendance.db')
-    ASSETS_PATH = os.path.join(BASE_DIR, 'assets')
\ No newline at end of file
+    ASSETS_PATH = os.path.join(BASE_DIR, 'assets')
+
+    # SQLite connections
+    DB_BUSY_TIMEOUT = 5.0  # Seconds a connection waits on a locked database
+    DB_SYNCHRONOUS = "NORMAL"  # With WAL, NORMAL only risks the last commits on power loss
+    DB_CACHE_SIZE_KB = 16384  # Page cache per connection
+    DB_WRITE_BEHIND = True  # Queue attendance marks and commit them in batches
+    DB_FLUSH_INTERVAL = 0.5  # Max seconds a queued attendance mark waits before commit
+    DB_WRITE_BATCH = 500  # Max attendance rows per transaction
+    SEARCH_PAGE_SIZE = 100  # Students returned per search page
+    PAGE_SIZE = 200  # Rows fetched per page by scrolling lists
+    EXPORT_BATCH_SIZE = 5000  # Rows pulled per fetchmany() call when exporting reports
+    LATE_AFTER = "09:00:00"  # Marks after this time count as late arrivals
+
+    # Bulk enrollment
+    ENROLL_BATCH_SIZE = 500  # Roster rows processed and inserted per transaction
+    PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+    # Face detection (Haar cascade)
+    DETECT_SCALE_FACTOR = 1.3
+    DETECT_MIN_NEIGHBORS = 5
+    DETECT_MIN_SIZE = 60  # Smallest face to find, in full-resolution pixels
+    DETECT_WIDTH = 320  # Frames are downscaled to this width before detection
+    DETECT_ROI_MARGIN = 0.5  # Padding around the previous face when searching only near it
+    DETECT_FULL_EVERY = 10  # Force a full-frame search after this many ROI-only frames
+    # Enrollment photos are single stills, so search them finely at full resolution
+    ENROLL_DETECT_SCALE_FACTOR = 1.1
+    ENROLL_DETECT_MIN_SIZE = 30
+    ENROLL_DETECT_WIDTH = None  # No downscaling
+
+    # Face quality gate (face_quality.py)
+    QUALITY_BURST_FRAMES = 5  # Frames captured per button press; the best one is kept
+    QUALITY_BURST_TIMEOUT = 1.0  # Max seconds spent collecting a burst
+    QUALITY_SHARPNESS_TARGET = 100.0  # Laplacian variance of a 96x96 crop that scores 1.0
+    QUALITY_CONTRAST_TARGET = 50.0  # Grey-level standard deviation that scores 1.0
+    QUALITY_FACE_SIZE_TARGET = 120  # Face width in pixels that scores 1.0
+    QUALITY_ASYMMETRY_LIMIT = 64.0  # Mean left/right mirror difference that scores 0.0
+    QUALITY_MIN_SHARPNESS = 0.3  # Enrollment floors for each score
+    QUALITY_MIN_BRIGHTNESS = 0.35
+    QUALITY_MIN_CONTRAST = 0.4
+    QUALITY_MIN_SIZE = 0.6
+    QUALITY_MIN_FRONTAL = 0.5
+
+    # Face matching
+    FACE_MATCH_THRESHOLD = 10  # Max Hamming distance between average hashes for a match
+    MATCH_CHUNK_ELEMENTS = 4_000_000  # Cap on the probe x template work matrix per matching pass
+    FACE_INDEX_BACKEND = "brute"  # "brute" (exact scan), "mih" (multi-index hashing) or "sharded" (exact scan on a process pool)
+    FACE_INDEX_MIH_CHUNKS = 4  # Substrings per 64-bit hash for the "mih" backend
+    MATCH_WORKERS = None  # Processes used by the "sharded" backend (None: one per core)
+    MATCH_PARALLEL_MIN_TEMPLATES = 50_000  # Smaller enrollments are matched in-process
+    FACE_INDEX_PATH = None  # Optional .npz file to persist the face index between runs
+    PROBE_CACHE_SIZE = 256  # Recent match results kept for near-duplicate probes (0 disables the cache)
+    PROBE_CACHE_TTL = 2.0  # Seconds a cached match result is reused
+    PROBE_CACHE_MAX_DISTANCE = 3  # Max Hamming distance between a probe and the cached one it reuses
+    PROBE_CACHE_GRID = 32  # Pixels per grid cell when keying the cache on face position
+    TEMPLATE_STORE = True  # Share templates between processes through a memory-mapped file next to the database
+    TEMPLATE_STORE_COMPACT_FRACTION = 0.25  # Rewrite the store once this share of its records is dead
+
+    # Multi-source ingest (ingest.py)
+    INGEST_QUEUE_SIZE = 4  # Frames buffered per source before the oldest is dropped
+    INGEST_WORKERS = None  # Detection/recognition worker threads (None: one per core)
+    INGEST_REFRESH_INTERVAL = 5.0  # Seconds between checks for students enrolled while ingest runs
+
+    # Headless recognition service (service.py)
+    SERVICE_HOST = "127.0.0.1"
+    SERVICE_PORT = 5000
+    SERVICE_MAX_BATCH = 32  # Max images recognized in one batched pass
+    SERVICE_MAX_WAIT = 0.005  # Seconds the first request waits for others to join its batch
+
+    # Camera
+    CAMERA_INDEX = 0  # cv2.VideoCapture device index (or a video file/stream URL, or an image folder)
+    CAMERA_WIDTH = 640
+    CAMERA_HEIGHT = 480
+    CAMERA_FPS = 30
+    CAMERA_IDLE_TIMEOUT = 60  # Seconds with no screen using the camera before it is released
+    DISPLAY_FPS = 15  # How often the video label is repainted; capture runs at the camera's own rate
+
+    # Continuous (hands-free) attendance
+    AUTO_EVERY_N_FRAMES = 5  # Run detection and matching on every Nth captured frame
+    AUTO_MARK_COOLDOWN = 30  # Seconds before the same student is reported again
+    AUTO_TRACK_IOU = 0.3  # Minimum box overlap to treat a detection as the same face
+    AUTO_TRACK_MAX_MISSED = 3  # Processed frames a face may be missing before its track is dropped
+    AUTO_POLL_INTERVAL_MS = 100  # How often the UI collects matches from the background worker
+
+    # Logging and metrics (metrics.py)
+    LOG_LEVEL = "WARNING"  # DEBUG shows every attendance mark and report query
+    METRICS_ENABLED = True  # False turns every metrics call into a no-op
+    METRICS_FILE = None  # JSON file the latest snapshot is written to, e.g. "metrics.json"
+    METRICS_PORT = None  # Local port serving snapshots over HTTP (service.py also has /metrics)
+    METRICS_EXPORT_INTERVAL = 10  # Seconds between snapshot writes
+
+    # Startup
+    STARTUP_WARMUP_DELAY_MS = 200  # After the home screen is up, load OpenCV and the face index in the background
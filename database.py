@@ -1,41 +1,258 @@
 import sqlite3
+import argparse
+import atexit
+import datetime
+import logging
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
+import weakref
+from config import Config
+from metrics import metrics
+import migrations
+
+logger = logging.getLogger(__name__)
+
+# Attendance dates are stored as ISO YYYY-MM-DD, so they sort, compare against ranges and
+# deduplicate across writers; older kiosks stored tkcalendar's locale format (M/D/YY).
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%y", "%m/%d/%Y")
+
+
+def normalize_date(value):
+    """ISO YYYY-MM-DD for a date, datetime or date string in one of DATE_FORMATS.
+
+    Strings in no known format are returned unchanged.
+    """
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    text = str(value).strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, date_format).date().isoformat()
+        except ValueError:
+            continue
+    return text
+
+
+def compute_face_template(face_image_path):
+    """Return (template_bytes, template_model) for a stored face image, or (None, None)."""
+    if not face_image_path:
+        return None, None
+    # Imported lazily so the database layer stays usable without OpenCV
+    from face_index import TEMPLATE_MODEL, face_hash_from_file
+    template = face_hash_from_file(face_image_path)
+    if template is None:
+        return None, None
+    return template.tobytes(), TEMPLATE_MODEL
+
+
+def _backfill_worker(row):
+    student_id, face_image_path = row
+    template, model = compute_face_template(face_image_path)
+    return student_id, template, model
+
+
+class AttendanceWriter(threading.Thread):
+    """Write-behind queue for attendance rows.
+
+    Marks are grouped into one transaction per batch instead of one commit (and fsync)
+    per row; a batch is written once it reaches batch_size or has waited flush_interval
+    seconds, and everything still queued is written by flush() and on close.
+    """
+
+    def __init__(self, db, flush_interval=Config.DB_FLUSH_INTERVAL, batch_size=Config.DB_WRITE_BATCH):
+        super().__init__(daemon=True)
+        self.db = db
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._pending = set()  # (student_id, date) queued but not committed yet
+        self._pending_lock = threading.Lock()
+
+    def put(self, row):
+        """Queue a (student_id, date, time_in) row; False if the student is already marked or queued that day."""
+        key = row[:2]
+        # Checked under the lock the writer holds while retiring committed rows, so a mark is
+        # always either still pending or visible in the table
+        with self._pending_lock:
+            if key in self._pending or self.db._attendance_stored(*key):
+                return False
+            self._pending.add(key)
+        self._queue.put(row)
+        return True
+
+    def flush(self, timeout=None):
+        # Queue a marker and wait until the writer has committed everything before it
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def stop(self, timeout=5.0):
+        self.flush(timeout)
+        self._queue.put(None)
+        self.join(timeout)
+
+    def run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            rows, markers = [], []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if isinstance(item, threading.Event):
+                    markers.append(item)
+                    break  # Flush requested, write what we have now
+                rows.append(item)
+                if len(rows) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)  # Handle the stop request after this batch
+                    break
+            if rows:
+                self.db._insert_attendance(rows)
+                with self._pending_lock:
+                    self._pending.difference_update(row[:2] for row in rows)
+            for marker in markers:
+                marker.set()
+        self.db._close_thread_connection()
+
+
+def _remove_database_files(path):
+    # A temporary database and its WAL files; missing ones were already removed
+    for file_path in (path, f"{path}-wal", f"{path}-shm"):
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+
+
+class _ThreadConnection:
+    """Closes a thread's connection when the thread exits and its thread-local data is dropped."""
+
+    def __init__(self, db, conn):
+        self.db = weakref.ref(db)
+        self.conn = conn
+
+    def __del__(self):
+        db = self.db()
+        if db is not None:
+            db._release_connection(self.conn)
+        else:
+            self.conn.close()
+
 
 class Database:
-    def __init__(self, db_name="attendance_system.db"):
-        self.conn = sqlite3.connect(db_name)
-        self.cursor = self.conn.cursor()
+    def __init__(self, db_name="attendance_system.db", write_behind=Config.DB_WRITE_BEHIND):
+        self.db_name = db_name
+        self._temporary = db_name == ":memory:"
+        if self._temporary:
+            # Per-thread connections must all see the same database, but in a shared-cache
+            # memory database their lock conflicts fail at once with SQLITE_LOCKED, which
+            # busy_timeout does not cover; a private temporary file waits like any other
+            fd, self.db_name = tempfile.mkstemp(prefix="attendance_", suffix=".db")
+            os.close(fd)
+            atexit.register(_remove_database_files, self.db_name)
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self.students_version = 0  # Bumped on every student change so face indexes know to rebuild
         self.create_tables()
+        self.attendance_writer = None
+        if write_behind:
+            self.attendance_writer = AttendanceWriter(self)
+            self.attendance_writer.start()
+            atexit.register(self.flush_attendance)  # Don't lose queued marks if close() is never called
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_name, timeout=Config.DB_BUSY_TIMEOUT, check_same_thread=False)
+        # WAL lets readers run alongside the writer; NORMAL sync is durable across app crashes
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={Config.DB_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size=-{int(Config.DB_CACHE_SIZE_KB)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    @property
+    def conn(self):
+        # One connection per thread, so GUI, workers and the write-behind thread never share one
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+            self._local.owner = _ThreadConnection(self, conn)
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    @property
+    def cursor(self):
+        cursor = getattr(self._local, "cursor", None)
+        if cursor is None:
+            cursor = self._local.cursor = self.conn.cursor()
+        return cursor
+
+    def _close_thread_connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._release_connection(conn)
+            self._local.conn = None
+            self._local.cursor = None
+            self._local.owner = None
+
+    def _release_connection(self, conn):
+        with self._connections_lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        conn.close()
 
     def create_tables(self):
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS students (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                student_id TEXT UNIQUE NOT NULL,
-                face_image_path TEXT,
-                class TEXT
-            )
-        """)
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS attendance (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                student_id TEXT NOT NULL,
-                attendance_date DATE NOT NULL,
-                time_in TEXT NOT NULL,
-                FOREIGN KEY (student_id) REFERENCES students(student_id)
-            )
-        """)
-        self.conn.commit()
+        # Creates a new database or upgrades an existing one to the latest schema version
+        migrations.migrate(self.conn)
 
     def add_student(self, name, student_id, face_image_path=None, student_class=None):
+        template, template_model = compute_face_template(face_image_path)
         try:
-            self.cursor.execute("INSERT INTO students (name, student_id, face_image_path, class) VALUES (?, ?, ?, ?)",
-                                (name, student_id, face_image_path, student_class))
+            self.cursor.execute("INSERT INTO students (name, student_id, face_image_path, class, face_template, template_model) VALUES (?, ?, ?, ?, ?, ?)",
+                                (name, student_id, face_image_path, student_class, template, template_model))
             self.conn.commit()
+            self.students_version += 1
             return True
         except sqlite3.IntegrityError:
             return False  # Student ID already exists
 
+    def add_students(self, students):
+        """Insert many students in one transaction, returns how many were added.
+
+        students are (name, student_id, face_image_path, class, face_template, template_model)
+        tuples; rows whose student ID already exists are skipped.
+        """
+        with self.conn:
+            self.cursor.executemany("""
+                INSERT INTO students (name, student_id, face_image_path, class, face_template, template_model)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(student_id) DO NOTHING
+            """, students)
+            added = self.cursor.rowcount
+        if added:
+            self.students_version += 1
+        return added
+
+    def get_student_ids(self):
+        self.cursor.execute("SELECT student_id FROM students")
+        return {row[0] for row in self.cursor.fetchall()}
+
     def get_student(self, student_id):
         self.cursor.execute("SELECT * FROM students WHERE student_id=?", (student_id,))
         return self.cursor.fetchone()
@@ -44,6 +261,40 @@ class Database:
         self.cursor.execute("SELECT * FROM students")
         return self.cursor.fetchall()
 
+    def search_students(self, query, limit=Config.SEARCH_PAGE_SIZE, offset=0):
+        """One page of students whose name, student ID or class has a word starting with each query term."""
+        terms = re.findall(r"\w+", query)
+        if not terms:
+            self.cursor.execute("SELECT id, name, student_id, face_image_path, class FROM students ORDER BY id LIMIT ? OFFSET ?",
+                                (limit, offset))
+            return self.cursor.fetchall()
+
+        if self._has_table("students_fts"):
+            match = " ".join(f'"{term}"*' for term in terms)
+            self.cursor.execute("""
+                SELECT s.id, s.name, s.student_id, s.face_image_path, s.class
+                FROM students_fts
+                JOIN students s ON s.id = students_fts.rowid
+                WHERE students_fts MATCH ?
+                LIMIT ? OFFSET ?
+            """, (match, limit, offset))
+        else:
+            conditions = " AND ".join("(name LIKE ? OR student_id LIKE ? OR class LIKE ?)" for _ in terms)
+            params = [f"%{term}%" for term in terms for _ in range(3)]
+            self.cursor.execute(f"SELECT id, name, student_id, face_image_path, class FROM students WHERE {conditions} ORDER BY id LIMIT ? OFFSET ?",
+                                (*params, limit, offset))
+        return self.cursor.fetchall()
+
+    def _has_table(self, name):
+        self.cursor.execute("SELECT 1 FROM sqlite_master WHERE name=?", (name,))
+        return self.cursor.fetchone() is not None
+
+    def get_students_page(self, after_id=None, limit=Config.PAGE_SIZE):
+        # Keyset pagination on the primary key: each page is a short index range scan
+        self.cursor.execute("SELECT id, name, student_id, face_image_path, class FROM students WHERE id > ? ORDER BY id LIMIT ?",
+                            (after_id or 0, limit))
+        return self.cursor.fetchall()
+
     def update_student_info(self, student_id, name=None, face_image_path=None, student_class=None):
         query = "UPDATE students SET "
         updates = []
@@ -52,8 +303,9 @@ class Database:
             updates.append("name=?")
             params.append(name)
         if face_image_path:
-            updates.append("face_image_path=?")
-            params.append(face_image_path)
+            template, template_model = compute_face_template(face_image_path)
+            updates.append("face_image_path=?, face_template=?, template_model=?")
+            params.extend([face_image_path, template, template_model])
         if student_class:
             updates.append("class=?")
             params.append(student_class)
@@ -65,53 +317,344 @@ class Database:
         if updates:
             self.cursor.execute(query, tuple(params))
             self.conn.commit()
+            self.students_version += 1
             return True
         return False
 
+    def get_student_templates(self):
+        # One query gives a matcher everything it needs without decoding any images
+        self.cursor.execute("SELECT id, name, student_id, face_image_path, class, face_template, template_model FROM students")
+        return self.cursor.fetchall()
+
+    def set_student_templates(self, templates):
+        """Store precomputed templates given as (student_id, template_bytes, template_model) tuples."""
+        self.cursor.executemany("UPDATE students SET face_template=?, template_model=? WHERE student_id=?",
+                                [(template, model, student_id) for student_id, template, model in templates])
+        self.conn.commit()
+
+    def backfill_templates(self, workers=None, force=False):
+        """Compute missing or outdated face templates in parallel, returns the number stored."""
+        from concurrent.futures import ProcessPoolExecutor
+        from face_index import TEMPLATE_MODEL
+        if force:
+            self.cursor.execute("SELECT student_id, face_image_path FROM students WHERE face_image_path IS NOT NULL")
+        else:
+            self.cursor.execute("""
+                SELECT student_id, face_image_path FROM students
+                WHERE face_image_path IS NOT NULL
+                  AND (face_template IS NULL OR template_model IS NOT ?)
+            """, (TEMPLATE_MODEL,))
+        rows = self.cursor.fetchall()
+        if not rows:
+            return 0
+
+        workers = workers or os.cpu_count() or 1
+        chunksize = max(1, len(rows) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = [result for result in executor.map(_backfill_worker, rows, chunksize=chunksize)
+                       if result[1] is not None]
+
+        self.set_student_templates(results)
+        self.students_version += 1
+        return len(results)
+
+    def get_students_revision(self):
+        """(revision, database_id): the revision changes with every write to students."""
+        self.cursor.execute("SELECT revision, database_id FROM students_revision")
+        return self.cursor.fetchone()
+
+    def get_student_rows(self):
+        self.cursor.execute("SELECT id, name, student_id, face_image_path, class FROM students")
+        return self.cursor.fetchall()
+
+    def template_store_path(self):
+        """Path of the memory-mapped template store for this database, None for in-memory databases."""
+        if self._temporary:
+            return None
+        return f"{self.db_name}.templates"
+
+    def sync_template_store(self, store, compact=False):
+        """Bring a template_store.TemplateStore up to the current students revision."""
+        conn = self.conn
+        # The write lock serializes store writers across processes; the reads below see
+        # one snapshot, so the templates written match the revision recorded with them
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            revision, database_id = conn.execute("SELECT revision, database_id FROM students_revision").fetchone()
+            store.open()
+            if store.revision != revision or store.database_id != database_id:
+                rows = conn.execute("""
+                    SELECT id, face_template FROM students
+                    WHERE face_template IS NOT NULL AND template_model = ?
+                """, (store.model,)).fetchall()
+                store.sync(revision, database_id, rows)
+            if compact:
+                store.compact()
+        finally:
+            conn.execute("COMMIT")
+        return revision
+
     def delete_student(self, student_id):
+        self.flush_attendance()
+        self.cursor.execute("DELETE FROM attendance WHERE student_id=?", (student_id,))
         self.cursor.execute("DELETE FROM students WHERE student_id=?", (student_id,))
-        self.cursor.execute("DELETE FROM attendance WHERE student_id=?", (student_id,)) # Also delete attendance records
         self.conn.commit()
+        self.students_version += 1
         return True
 
     def mark_attendance(self, student_id, date, time_in):
-        print(f"DB - mark_attendance() called with ID: '{student_id}', Date: '{date}', Time: '{time_in}'")
+        # True for a new mark, False if the student was already marked that day
+        date = normalize_date(date)
+        logger.debug("mark_attendance(%r, %r, %r)", student_id, date, time_in)
+        metrics.incr("attendance_marks")
+        if self.attendance_writer is not None:
+            return self.attendance_writer.put((student_id, date, time_in))
+        return self._insert_attendance([(student_id, date, time_in)])
+
+    def _insert_attendance(self, rows):
         try:
-            self.cursor.execute("INSERT INTO attendance (student_id, attendance_date, time_in) VALUES (?, ?, ?)",
-                                (student_id, date, time_in))
-            self.conn.commit()
-            print("DB - Attendance record inserted successfully.")
-            return True
+            with metrics.timer("db_insert"), self.conn:
+                # The UNIQUE (student_id, attendance_date) constraint turns repeat marks into no-ops
+                self.cursor.executemany("""
+                    INSERT INTO attendance (student_id, attendance_date, time_in) VALUES (?, ?, ?)
+                    ON CONFLICT (student_id, attendance_date) DO NOTHING
+                """, rows)
+                inserted = self.cursor.rowcount
+            metrics.incr("attendance_inserted", inserted)
+            logger.debug("%d of %d attendance record(s) inserted", inserted, len(rows))
+            return inserted > 0
         except sqlite3.Error as e:
-            print(f"DB - Error inserting attendance: {e}")
+            metrics.incr("db_errors")
+            logger.error("Error inserting attendance: %s", e)
             return False
 
+    def flush_attendance(self):
+        """Wait until queued write-behind attendance rows are committed."""
+        if self.attendance_writer is not None:
+            self.attendance_writer.flush()
+
+    def is_marked(self, student_id, date):
+        date = normalize_date(date)
+        self.flush_attendance()
+        return self._attendance_stored(student_id, date)
+
+    def _attendance_stored(self, student_id, date):
+        self.cursor.execute("SELECT 1 FROM attendance WHERE student_id=? AND attendance_date=?", (student_id, date))
+        return self.cursor.fetchone() is not None
+
+    def get_marked_student_ids(self, date):
+        date = normalize_date(date)
+        self.flush_attendance()
+        self.cursor.execute("SELECT student_id FROM attendance WHERE attendance_date=?", (date,))
+        return [row[0] for row in self.cursor.fetchall()]
+
     def get_attendance(self, date):
+        date = normalize_date(date)
+        self.flush_attendance()
         self.cursor.execute("SELECT s.name, a.student_id, a.time_in FROM attendance a JOIN students s ON a.student_id = s.student_id WHERE a.attendance_date=?", (date,))
         return self.cursor.fetchall()
 
     def get_attendance_report(self, start_date, end_date):
-        print(f"DB - get_attendance_report() called with Start Date: '{start_date}', End Date: '{end_date}'")
+        start_date, end_date = normalize_date(start_date), normalize_date(end_date)
+        logger.debug("get_attendance_report(%r, %r)", start_date, end_date)
+        self.flush_attendance()
         try:
-            self.cursor.execute("""
+            with metrics.timer("db_report"):
+                self.cursor.execute("""
+                    SELECT s.name, a.student_id, a.attendance_date, a.time_in
+                    FROM attendance a
+                    JOIN students s ON a.student_id = s.student_id
+                    WHERE a.attendance_date BETWEEN ? AND ?
+                    ORDER BY a.attendance_date, a.time_in
+                """, (start_date, end_date))
+                report_data = self.cursor.fetchall()
+            logger.debug("%d report rows fetched", len(report_data))
+            return report_data
+        except sqlite3.Error as e:
+            metrics.incr("db_errors")
+            logger.error("Error fetching report data: %s", e)
+            return []
+
+    def iter_attendance_report(self, start_date, end_date, batch_size=Config.EXPORT_BATCH_SIZE):
+        """Yield report rows (name, student_id, date, time_in) in lists of up to batch_size.
+
+        Rows are streamed from an open cursor with fetchmany(), so memory stays flat however
+        large the date range is. Uses its own cursor so it can be iterated while other queries run.
+        """
+        start_date, end_date = normalize_date(start_date), normalize_date(end_date)
+        self.flush_attendance()
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("""
                 SELECT s.name, a.student_id, a.attendance_date, a.time_in
                 FROM attendance a
                 JOIN students s ON a.student_id = s.student_id
                 WHERE a.attendance_date BETWEEN ? AND ?
-                ORDER BY a.attendance_date, a.time_in
+                ORDER BY a.attendance_date, a.time_in, a.id
             """, (start_date, end_date))
-            report_data = self.cursor.fetchall()
-            print(f"DB - Report Data fetched: {report_data}")
-            return report_data
-        except sqlite3.Error as e:
-            print(f"DB - Error fetching report data: {e}")
-            return []
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
+    def add_term(self, term, start_date, end_date):
+        """Define (or redefine) a term and build its per-student summary from existing attendance."""
+        start_date, end_date = normalize_date(start_date), normalize_date(end_date)
+        self.flush_attendance()
+        with self.conn:
+            self.cursor.execute("DELETE FROM attendance_student_term WHERE term=?", (term,))
+            self.cursor.execute("""
+                INSERT INTO terms (term, start_date, end_date) VALUES (?, ?, ?)
+                ON CONFLICT (term) DO UPDATE SET start_date = excluded.start_date, end_date = excluded.end_date
+            """, (term, start_date, end_date))
+            self.cursor.execute("""
+                INSERT INTO attendance_student_term (term, student_id, days_present)
+                SELECT ?, student_id, COUNT(*) FROM attendance
+                WHERE attendance_date BETWEEN ? AND ?
+                GROUP BY student_id
+            """, (term, start_date, end_date))
+
+    def get_terms(self):
+        self.cursor.execute("SELECT term, start_date, end_date FROM terms ORDER BY start_date")
+        return self.cursor.fetchall()
+
+    def get_attendance_percentages(self, term, student_class=None):
+        """(student_id, name, class, days_present, school_days, percentage) per student for a term.
+
+        School days are the days in the term on which anyone was marked present.
+        """
+        self.flush_attendance()
+        self.cursor.execute("""
+            SELECT s.student_id, s.name, s.class, COALESCE(st.days_present, 0), d.school_days,
+                   ROUND(100.0 * COALESCE(st.days_present, 0) / MAX(d.school_days, 1), 1)
+            FROM students s
+            CROSS JOIN (
+                SELECT COUNT(DISTINCT c.attendance_date) AS school_days
+                FROM attendance_class_daily c JOIN terms t ON t.term = ?
+                WHERE c.attendance_date BETWEEN t.start_date AND t.end_date
+            ) d
+            LEFT JOIN attendance_student_term st ON st.term = ? AND st.student_id = s.student_id
+            WHERE ? IS NULL OR s.class = ?
+            ORDER BY s.class, s.name
+        """, (term, term, student_class, student_class))
+        return self.cursor.fetchall()
+
+    def get_class_daily_totals(self, start_date, end_date, student_class=None):
+        """(date, class, present, enrolled, first_time_in) for each class and day with attendance."""
+        start_date, end_date = normalize_date(start_date), normalize_date(end_date)
+        self.flush_attendance()
+        self.cursor.execute("""
+            SELECT c.attendance_date, c.class, c.present, COALESCE(e.enrolled, 0), c.first_time_in
+            FROM attendance_class_daily c
+            LEFT JOIN (SELECT COALESCE(class, '') AS class, COUNT(*) AS enrolled FROM students GROUP BY 1) e
+                ON e.class = c.class
+            WHERE c.attendance_date BETWEEN ? AND ? AND (? IS NULL OR c.class = ?)
+            ORDER BY c.attendance_date, c.class
+        """, (start_date, end_date, student_class, student_class))
+        return self.cursor.fetchall()
+
+    def get_absentees(self, date, student_class=None):
+        """(student_id, name, class) of students with no attendance on date."""
+        date = normalize_date(date)
+        self.flush_attendance()
+        self.cursor.execute("""
+            SELECT s.student_id, s.name, s.class FROM students s
+            WHERE (? IS NULL OR s.class = ?)
+              AND NOT EXISTS (SELECT 1 FROM attendance a WHERE a.student_id = s.student_id AND a.attendance_date = ?)
+            ORDER BY s.class, s.name
+        """, (student_class, student_class, date))
+        return self.cursor.fetchall()
+
+    def get_late_arrivals(self, date, late_after=Config.LATE_AFTER, student_class=None):
+        """(student_id, name, class, time_in) of students who arrived after late_after on date."""
+        date = normalize_date(date)
+        self.flush_attendance()
+        self.cursor.execute("""
+            SELECT s.student_id, s.name, s.class, a.time_in
+            FROM attendance a JOIN students s ON s.student_id = a.student_id
+            WHERE a.attendance_date = ? AND a.time_in > ? AND (? IS NULL OR s.class = ?)
+            ORDER BY a.time_in
+        """, (date, late_after, student_class, student_class))
+        return self.cursor.fetchall()
+
+    def get_attendance_report_page(self, start_date, end_date, after=None, limit=Config.PAGE_SIZE):
+        """One page of report rows (name, student_id, date, time_in, attendance id).
+
+        Pages are keyset-paginated: pass the (date, time_in, id) of the last row seen as
+        `after` to continue, so every page is an index range scan however deep the user scrolls.
+        """
+        start_date, end_date = normalize_date(start_date), normalize_date(end_date)
+        if after is None:
+            self.flush_attendance()
+            where, params = "a.attendance_date BETWEEN ? AND ?", (start_date, end_date, limit)
+        else:
+            # The row-value bound replaces the start date so SQLite seeks straight to it
+            where, params = "(a.attendance_date, a.time_in, a.id) > (?, ?, ?) AND a.attendance_date <= ?", (*after, end_date, limit)
+        self.cursor.execute(f"""
+            SELECT s.name, a.student_id, a.attendance_date, a.time_in, a.id
+            FROM attendance a
+            JOIN students s ON a.student_id = s.student_id
+            WHERE {where}
+            ORDER BY a.attendance_date, a.time_in, a.id
+            LIMIT ?
+        """, params)
+        return self.cursor.fetchall()
 
     def close(self):
-        self.conn.close()
+        # Flush queued attendance before closing every thread's connection
+        if self.attendance_writer is not None:
+            self.attendance_writer.stop()
+            self.attendance_writer = None
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+        if self._temporary:
+            _remove_database_files(self.db_name)
+
+
+_shared_databases = {}
+_shared_lock = threading.Lock()
+
+
+def get_database(db_name="attendance_system.db"):
+    """Process-wide Database for db_name, so modules share connections and the write-behind queue."""
+    with _shared_lock:
+        db = _shared_databases.get(db_name)
+        if db is None:
+            db = _shared_databases[db_name] = Database(db_name)
+        return db
 
 if __name__ == '__main__':
-    db = Database()
+    parser = argparse.ArgumentParser(description="Attendance database utilities")
+    parser.add_argument("--db", default="attendance_system.db", help="Path to the SQLite database")
+    subparsers = parser.add_subparsers(dest="command")
+    backfill_parser = subparsers.add_parser("backfill", help="Compute face templates for existing students")
+    backfill_parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    backfill_parser.add_argument("--force", action="store_true", help="Recompute templates that are already current")
+    term_parser = subparsers.add_parser("add-term", help="Define a term for the attendance summaries")
+    term_parser.add_argument("term")
+    term_parser.add_argument("start_date", help="YYYY-MM-DD")
+    term_parser.add_argument("end_date", help="YYYY-MM-DD")
+    term_report_parser = subparsers.add_parser("term-report", help="Attendance percentage per student for a term")
+    term_report_parser.add_argument("term")
+    term_report_parser.add_argument("--class", dest="student_class", default=None)
+    args = parser.parse_args()
+
+    db = Database(args.db)
+    if args.command == "backfill":
+        count = db.backfill_templates(workers=args.workers, force=args.force)
+        print(f"Stored face templates for {count} students.")
+    elif args.command == "add-term":
+        db.add_term(args.term, args.start_date, args.end_date)
+    elif args.command == "term-report":
+        for student_id, name, student_class, days_present, school_days, percentage in \
+                db.get_attendance_percentages(args.term, args.student_class):
+            print(f"{student_class or '-'}\t{student_id}\t{name}\t{days_present}/{school_days}\t{percentage}%")
     # Example usage:
     # db.add_student("John Doe", "JD123", "faces/jd123.jpg", "10A")
     # student = db.get_student("JD123")
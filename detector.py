@@ -0,0 +1,78 @@
+import cv2
+from config import Config
+from metrics import metrics
+
+
+class FaceDetector:
+    """Haar face detector that runs on a downscaled grayscale frame and maps boxes back.
+
+    With use_roi=True consecutive calls only search around the faces found in the previous
+    frame, falling back to the full frame when they are lost and every full_every frames
+    so people walking into view are still picked up. CascadeClassifier objects are not
+    thread safe, so each thread should own its FaceDetector.
+    """
+
+    def __init__(self, scale_factor=Config.DETECT_SCALE_FACTOR, min_neighbors=Config.DETECT_MIN_NEIGHBORS,
+                 min_size=Config.DETECT_MIN_SIZE, detect_width=Config.DETECT_WIDTH,
+                 roi_margin=Config.DETECT_ROI_MARGIN, full_every=Config.DETECT_FULL_EVERY):
+        self.face_cascade = cv2.CascadeClassifier(
+            cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+        )
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size  # Smallest face in full-resolution pixels
+        self.detect_width = detect_width  # Frames wider than this are shrunk before detection
+        self.roi_margin = roi_margin  # ROI padding as a fraction of the previous face size
+        self.full_every = full_every
+        self._previous = []
+        self._frames_since_full = 0
+
+    def reset(self):
+        self._previous = []
+        self._frames_since_full = 0
+
+    def detect(self, frame, use_roi=False):
+        """Return face boxes (x, y, w, h) in the coordinates of the given BGR or grayscale frame."""
+        with metrics.timer("detect"):
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+            height, width = gray.shape[:2]
+            scale = min(1.0, self.detect_width / width) if self.detect_width else 1.0
+            if scale < 1.0:
+                small = cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+            else:
+                small = gray
+
+            faces = []
+            if use_roi and self._previous and self._frames_since_full < self.full_every:
+                x0, y0, x1, y1 = self._roi(self._previous, scale, small.shape)
+                faces = [(x + x0, y + y0, w, h) for (x, y, w, h) in self._detect(small[y0:y1, x0:x1], scale)]
+                self._frames_since_full += 1
+            if not faces:
+                faces = self._detect(small, scale)
+                self._frames_since_full = 0
+
+            boxes = [(int(x / scale), int(y / scale), int(w / scale), int(h / scale)) for (x, y, w, h) in faces]
+            if use_roi:
+                self._previous = boxes
+            return boxes
+
+    def _detect(self, image, scale):
+        min_side = max(1, int(self.min_size * scale))
+        if image.shape[0] < min_side or image.shape[1] < min_side:
+            return []
+        faces = self.face_cascade.detectMultiScale(
+            image,
+            scaleFactor=self.scale_factor,
+            minNeighbors=self.min_neighbors,
+            minSize=(min_side, min_side)
+        )
+        return [tuple(int(v) for v in face) for face in faces]
+
+    def _roi(self, boxes, scale, shape):
+        # Union of the previous faces, padded, in downscaled coordinates
+        x0 = min(x - w * self.roi_margin for (x, y, w, h) in boxes)
+        y0 = min(y - h * self.roi_margin for (x, y, w, h) in boxes)
+        x1 = max(x + w * (1 + self.roi_margin) for (x, y, w, h) in boxes)
+        y1 = max(y + h * (1 + self.roi_margin) for (x, y, w, h) in boxes)
+        return (max(0, int(x0 * scale)), max(0, int(y0 * scale)),
+                min(shape[1], int(x1 * scale) + 1), min(shape[0], int(y1 * scale) + 1))
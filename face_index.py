@@ -0,0 +1,311 @@
+import logging
+import os
+import threading
+import cv2
+import numpy as np
+import imagehash  # You might need to install this: pip install imagehash
+from PIL import Image
+from config import Config
+from detector import FaceDetector
+from metrics import metrics
+from probe_cache import ProbeCache, coarse_key
+from template_index import HASH_BYTES, TemplateIndex, create_index
+from template_store import TemplateStore
+
+logger = logging.getLogger(__name__)
+
+FACE_SIZE = (100, 100)  # Faces are standardized to this size before hashing
+TEMPLATE_MODEL = "ahash8x8-face-v3"  # Stored next to each template; bump when the hashing changes
+
+_local = threading.local()  # Per-thread detector for cropping enrollment photos
+
+
+def face_hash(gray_face):
+    """Average hash of a grayscale face image, packed into HASH_BYTES uint8 values."""
+    resized = cv2.resize(gray_face, FACE_SIZE)
+    bits = imagehash.average_hash(Image.fromarray(resized)).hash.flatten()
+    return np.packbits(bits)
+
+
+def face_hashes(faces_bgr):
+    """Hash a list of BGR face crops into an (M, HASH_BYTES) uint8 matrix."""
+    hashes = [face_hash(cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)) for face in faces_bgr]
+    return np.array(hashes, dtype=np.uint8).reshape(-1, HASH_BYTES)
+
+
+def enrollment_detector():
+    """This thread's FaceDetector for enrollment photos, with the ENROLL_DETECT_* parameters.
+
+    Every stored template is cropped with it, so bulk enrollment, the GUI and backfills
+    agree on where the face in a photo is.
+    """
+    detector = getattr(_local, "detector", None)
+    if detector is None:
+        detector = _local.detector = FaceDetector(scale_factor=Config.ENROLL_DETECT_SCALE_FACTOR,
+                                                  min_size=Config.ENROLL_DETECT_MIN_SIZE,
+                                                  detect_width=Config.ENROLL_DETECT_WIDTH)
+    return detector
+
+
+def crop_largest_face(gray):
+    # Enrollment photos are whole camera frames while probes are face crops, so templates
+    # are taken from the largest detected face; None when the photo has no detectable face
+    faces = enrollment_detector().detect(gray)
+    if not faces:
+        return None
+    x, y, w, h = max(faces, key=lambda face: face[2] * face[3])
+    return gray[y:y + h, x:x + w]
+
+
+def face_hash_from_file(image_path):
+    """Template of the largest face in an image file, or None if there is no readable face."""
+    if not image_path or not os.path.exists(image_path):
+        return None
+    gray = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        return None
+    face = crop_largest_face(gray)
+    if face is None:
+        logger.warning("No face found in %s, not storing a template for it", image_path)
+        return None
+    return face_hash(face)
+
+
+class FaceIndex:
+    """Enrolled face hashes of every student, searched through a pluggable TemplateIndex.
+
+    The "brute" backend matches a probe in one vectorized pass; "mih" answers in sublinear
+    time for district-sized enrollments. With index_path set the index is loaded from disk
+    at startup and only the students that changed since it was saved are re-inserted.
+
+    With the template store enabled (the default for file databases) templates are read
+    from a memory-mapped file shared by every process instead. Whenever the database's
+    students revision moves, whichever process changed it, only the store records appended
+    or tombstoned since the last refresh are applied to the index; index_path still persists
+    the index between runs.
+    """
+
+    def __init__(self, db, threshold=Config.FACE_MATCH_THRESHOLD, backend=Config.FACE_INDEX_BACKEND,
+                 index_path=Config.FACE_INDEX_PATH, use_store=Config.TEMPLATE_STORE):
+        self.db = db
+        self.threshold = threshold
+        self.backend = backend
+        self.index_path = index_path
+        store_path = db.template_store_path() if use_store else None
+        self.store = TemplateStore(store_path, TEMPLATE_MODEL) if store_path else None
+        self.cache = ProbeCache() if Config.PROBE_CACHE_SIZE else None
+        # (students by id, index) swapped as one tuple so background matchers never see a half-built index
+        self._entries = ({}, None)
+        self._version = None
+        self._store_state = None  # (database_id, record ids, alive mask, keys) the index reflects
+
+    @property
+    def students(self):
+        return list(self._entries[0].values())
+
+    @property
+    def index(self):
+        return self._entries[1]
+
+    def invalidate(self):
+        self._version = None
+
+    def _load_index(self):
+        if self.index is not None:
+            return self.index.copy()  # Copy-on-write, readers keep using the current one
+        if self.index_path and os.path.exists(self.index_path):
+            try:
+                index = TemplateIndex.load(self.index_path)
+                if index.kind == self.backend:
+                    return index
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("Ignoring unreadable face index %s: %s", self.index_path, e)
+        return create_index(self.backend)
+
+    def refresh(self):
+        if self.store is not None:
+            self._refresh_from_store()
+            return
+        # Resync only when the students table changed, in this process or another one
+        if self._version == self.db.get_students_revision():
+            return
+
+        students, templates = self._read_templates()
+        index = self._load_index()
+        changed = False
+        for key in index.keys():
+            if key not in templates:
+                index.remove(key)
+                changed = True
+        added = [key for key, template in templates.items()
+                 if key not in index or index.get(key).tobytes() != template]
+        if added:
+            index.add_many(added, np.frombuffer(b"".join(templates[key] for key in added), dtype=np.uint8))
+            changed = True
+        if changed and self.index_path:
+            index.save(self.index_path)
+
+        self._entries = (students, index)
+        self._version = self.db.get_students_revision()  # Read after any templates written back above
+
+    def _refresh_from_store(self):
+        # One single-row query tells whether any process changed the students since the last load
+        revision = self.db.get_students_revision()
+        if self._version == revision:
+            return
+        self.store.open()
+        if (self.store.revision, self.store.database_id) != revision:
+            self._read_templates()  # Hashes and stores any missing templates first
+            self.db.sync_template_store(self.store)
+
+        rows = {row[0]: row for row in self.db.get_student_rows()}
+        students = {row[2]: row for row in rows.values()}
+        ids, templates, alive = self.store.live()
+        changed = True
+        if self.index is None and not self.index_path:
+            # Nothing to start from: search the mapped templates in place, without copying them
+            keys = self._store_keys(rows, ids, alive)
+            index = create_index(self.backend)
+            index.attach(keys, templates, alive)
+            changed = False
+        elif self._store_appended(ids):
+            index, keys, changed = self._apply_store_changes(rows, ids, templates, alive)
+        else:
+            # First load from index_path, or the store was rewritten (compacted or rebuilt)
+            keys = self._store_keys(rows, ids, alive)
+            index = self._load_index()
+            changed = self._reconcile(index, keys, templates)
+        if changed and self.index_path:
+            index.save(self.index_path)
+
+        self._entries = (students, index)
+        self._store_state = (self.store.database_id, ids.copy(), alive, keys)
+        self._version = (self.store.revision, self.store.database_id)
+
+    def _store_keys(self, rows, ids, alive):
+        # Student ID of every store record, None for dead records
+        keys = []
+        for row, student_row_id in enumerate(ids.tolist()):
+            student = rows.get(student_row_id) if alive[row] else None
+            if student is None:
+                alive[row] = False  # Tombstoned, or deleted after the store was written
+                keys.append(None)
+            else:
+                keys.append(student[2])
+        return keys
+
+    def _store_appended(self, ids):
+        # The store only appends and tombstones between rewrites, so the records seen last
+        # time are still a prefix of the file unless it was compacted or rebuilt since
+        if self.index is None or self._store_state is None:
+            return False
+        database_id, previous_ids, _, _ = self._store_state
+        count = len(previous_ids)
+        return (database_id == self.store.database_id and len(ids) >= count
+                and np.array_equal(ids[:count], previous_ids))
+
+    def _apply_store_changes(self, rows, ids, templates, alive):
+        # Remove the records that died since the last refresh, then add the new live ones
+        _, previous_ids, previous_alive, keys = self._store_state
+        was_alive = np.zeros(len(ids), dtype=bool)
+        was_alive[:len(previous_ids)] = previous_alive
+        keys = keys + [None] * (len(ids) - len(previous_ids))
+        changed_rows = np.flatnonzero(alive != was_alive)
+        if not len(changed_rows):
+            return self.index, keys, False
+
+        index = self.index.copy()  # Copy-on-write, readers keep using the current one
+        for row in changed_rows[~alive[changed_rows]].tolist():
+            index.remove(keys[row])
+            keys[row] = None
+        for row in changed_rows[alive[changed_rows]].tolist():
+            student = rows.get(int(ids[row]))
+            if student is None:
+                alive[row] = False  # Deleted after the store was written
+                continue
+            keys[row] = student[2]
+            index.add(student[2], templates[row])
+        return index, keys, True
+
+    def _reconcile(self, index, keys, templates):
+        # Bring index in line with the live store records; True if anything changed
+        wanted = {key: row for row, key in enumerate(keys) if key is not None}
+        changed = False
+        for key in index.keys():
+            if key not in wanted:
+                index.remove(key)
+                changed = True
+        added = [key for key, row in wanted.items()
+                 if key not in index or index.get(key).tobytes() != templates[row].tobytes()]
+        if added:
+            index.add_many(added, templates[[wanted[key] for key in added]])
+            changed = True
+        return changed
+
+    def _read_templates(self):
+        students = {}
+        templates = {}
+        computed = []
+        for row in self.db.get_student_templates():
+            student, template, model = row[:5], row[5], row[6]
+            if template is None or model != TEMPLATE_MODEL:
+                # Rows enrolled before templates were stored are hashed once and written back
+                template = face_hash_from_file(student[3])
+                if template is None:
+                    continue
+                template = template.tobytes()
+                computed.append((student[2], template, TEMPLATE_MODEL))
+            students[student[2]] = student
+            templates[student[2]] = template
+
+        if computed:
+            self.db.set_student_templates(computed)
+        return students, templates
+
+    def search(self, probes, k=1, max_distance=None, cache_keys=None):
+        """Top-k (student, distance) lists for each probe hash, nearest first.
+
+        With cache_keys (a probe_cache.coarse_key per probe) near-duplicates of recent probes
+        reuse the cached result instead of searching the index again.
+        """
+        with metrics.timer("match"):
+            students, index = self._entries
+            probes = np.asarray(probes, dtype=np.uint8).reshape(-1, HASH_BYTES)
+            if index is None:
+                return [[] for _ in probes]
+            if cache_keys is None or self.cache is None:
+                return self._search(students, index, probes, k, max_distance)
+
+            results = [None] * len(probes)
+            missing = []
+            for i, (probe, key) in enumerate(zip(probes, cache_keys)):
+                results[i] = self.cache.get((key, k, max_distance), probe, index)
+                if results[i] is None:
+                    missing.append(i)
+            if missing:
+                for i, result in zip(missing, self._search(students, index, probes[missing], k, max_distance)):
+                    results[i] = result
+                    self.cache.put((cache_keys[i], k, max_distance), probes[i], result, index)
+            return results
+
+    def _search(self, students, index, probes, k, max_distance):
+        # A student deleted by another process can outlive its row until the next refresh
+        return [[(students[key], distance) for key, distance in matches if key in students]
+                for matches in index.search(probes, k, max_distance)]
+
+    def best_match(self, face_bgr, refresh=True):
+        """Return (student, distance) for the closest enrolled face, or (None, None) above threshold."""
+        return self.best_matches([face_bgr], refresh=refresh)[0]
+
+    def best_matches(self, faces_bgr, refresh=True, boxes=None):
+        # Any thread may refresh (database connections are per thread), but not two at once: worker
+        # threads pass refresh=False and leave it to the one thread that owns refreshing.
+        # With the boxes the crops came from, repeated faces are answered from the probe cache.
+        if refresh:
+            self.refresh()
+
+        cache_keys = None if boxes is None else [coarse_key(face, box) for face, box in zip(faces_bgr, boxes)]
+        results = []
+        for matches in self.search(face_hashes(faces_bgr), k=1, max_distance=self.threshold, cache_keys=cache_keys):
+            results.append(matches[0] if matches else (None, None))
+        return results
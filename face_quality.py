@@ -0,0 +1,85 @@
+import cv2
+import numpy as np
+from config import Config
+
+# Fast face quality checks, used to pick the best frame of a short burst before enrolling or
+# matching. Each check is a score in [0, 1]; a face passes when every score reaches its
+# Config.QUALITY_MIN_* floor, and the overall score (geometric mean) ranks frames.
+
+QUALITY_SIZE = (96, 96)  # Crops are scored at a fixed size so scores compare across distances
+
+ISSUES = {
+    'sharpness': "too blurry",
+    'brightness': "badly lit",
+    'contrast': "too little contrast",
+    'size': "too far from the camera",
+    'frontal': "not facing the camera",
+}
+
+
+def face_quality(gray, box):
+    """Score the face at box (x, y, w, h) in a grayscale frame.
+
+    Returns a dict with a score per check, the overall 'score', 'passed' and 'issues', a
+    list of human readable problems for the checks that failed.
+    """
+    x, y, w, h = box
+    face = cv2.resize(gray[y:y + h, x:x + w], QUALITY_SIZE, interpolation=cv2.INTER_AREA)
+
+    # Variance of the Laplacian: high for sharp edges, collapses with motion or focus blur
+    sharpness = cv2.Laplacian(face, cv2.CV_64F).var() / Config.QUALITY_SHARPNESS_TARGET
+    mean, std = cv2.meanStdDev(face)
+    brightness = 1.0 - abs(float(mean[0][0]) - 128.0) / 128.0
+    contrast = float(std[0][0]) / Config.QUALITY_CONTRAST_TARGET
+    size = min(w, h) / Config.QUALITY_FACE_SIZE_TARGET
+    # A frontal face is close to its mirror image; turned heads are lopsided
+    half = QUALITY_SIZE[0] // 2
+    left = face[:, :half].astype(np.int16)
+    right = face[:, -half:][:, ::-1].astype(np.int16)
+    frontal = 1.0 - np.abs(left - right).mean() / Config.QUALITY_ASYMMETRY_LIMIT
+
+    scores = {
+        'sharpness': sharpness,
+        'brightness': brightness,
+        'contrast': contrast,
+        'size': size,
+        'frontal': frontal,
+    }
+    scores = {name: float(min(1.0, max(0.0, value))) for name, value in scores.items()}
+    minimums = {
+        'sharpness': Config.QUALITY_MIN_SHARPNESS,
+        'brightness': Config.QUALITY_MIN_BRIGHTNESS,
+        'contrast': Config.QUALITY_MIN_CONTRAST,
+        'size': Config.QUALITY_MIN_SIZE,
+        'frontal': Config.QUALITY_MIN_FRONTAL,
+    }
+    issues = [ISSUES[name] for name, value in scores.items() if value < minimums[name]]
+    scores['score'] = float(np.prod([max(value, 1e-3) for value in scores.values()]) ** (1.0 / len(minimums)))
+    scores['passed'] = not issues
+    scores['issues'] = issues
+    return scores
+
+
+def best_face(frames, face_detector):
+    """Pick the best single-face frame of a burst.
+
+    Returns (frame, box, quality) for the highest scoring frame that shows exactly one face,
+    preferring frames that pass the quality gate, or (None, None, reason) when no frame
+    does, reason being "no face" or "multiple faces".
+    """
+    best = None
+    reason = "no face"
+    for frame in frames:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        boxes = face_detector.detect(gray)
+        if len(boxes) != 1:
+            if boxes:
+                reason = "multiple faces"
+            continue
+        quality = face_quality(gray, boxes[0])
+        rank = (quality['passed'], quality['score'])
+        if best is None or rank > best[0]:
+            best = (rank, frame, boxes[0], quality)
+    if best is None:
+        return None, None, reason
+    return best[1:]
@@ -1,39 +1,86 @@
-import cv2
-import numpy as np
-from database import Database
+from config import Config
+from database import get_database
+from detector import FaceDetector
+from face_index import FaceIndex, face_hashes
+from probe_cache import coarse_key
 
 class FaceRecognizer:
-    def __init__(self):
-        self.db = Database()
-        self.face_cascade = cv2.CascadeClassifier(
-            cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-        )
-        self.known_faces = []
-        self.known_face_ids = []
-        self.known_face_names = []
+    """Recognition engine shared by the GUI and headless tools.
+
+    Enrolled templates live in contiguous (N, 8) uint8 arrays inside the FaceIndex backend,
+    about 8 bytes per student, and probes are matched in chunked vectorized passes.
+    """
+
+    def __init__(self, db=None, threshold=Config.FACE_MATCH_THRESHOLD):
+        self.db = db or get_database()
+        self.face_detector = FaceDetector()
+        self.face_index = FaceIndex(self.db, threshold)
         self.load_known_faces()
-    
+
+    @property
+    def threshold(self):
+        return self.face_index.threshold
+
+    @property
+    def known_face_ids(self):
+        return [student[2] for student in self.face_index.students]
+
+    @property
+    def known_face_names(self):
+        return [student[1] for student in self.face_index.students]
+
     def load_known_faces(self):
-        employees = self.db.get_all_employees()
-        for emp in employees:
-            self.known_face_ids.append(emp[2])  # employee_id
-            self.known_face_names.append(emp[1])  # name
-    
-    def detect_faces(self, frame):
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(
-            image=gray,
-            scaleFactor=1.1,
-            minNeighbors=5,
-            minSize=(30, 30)
-        )
-        
+        # Cheap no-op unless students were added, updated or deleted since the last load
+        self.face_index.refresh()
+
+    def recognize(self, frames, k=1, detect=True, refresh=True, max_distance=None):
+        """Recognize every face in a batch of BGR frames (or face crops with detect=False).
+
+        Returns one list of faces per input, each face a dict with 'face_location', the
+        best 'student_id'/'name'/'distance' ("Unknown" above the threshold) and 'matches',
+        the top-k (student_id, name, distance) tuples nearest first, limited to max_distance
+        (default: the match threshold). All faces in the batch are matched in a single pass.
+        When several threads recognize at once, let one of them refresh and pass refresh=False
+        on the others; refreshes must not run concurrently.
+        """
+        if refresh:
+            self.load_known_faces()
+        if max_distance is None:
+            max_distance = self.threshold
+
         results = []
-        for (x, y, w, h) in faces:
-            results.append({
-                'face_location': (x, y, w, h),
-                'name': "Unknown",
-                'emp_id': "Unknown"
-            })
-        
-        return results
\ No newline at end of file
+        crops = []
+        boxes_seen = []
+        for frame in frames:
+            if detect:
+                boxes = self.face_detector.detect(frame)
+            else:
+                boxes = [(0, 0, frame.shape[1], frame.shape[0])]
+            faces = []
+            for (x, y, w, h) in boxes:
+                crops.append(frame[y:y + h, x:x + w])
+                boxes_seen.append((x, y, w, h))
+                faces.append({'face_location': (x, y, w, h)})
+            results.append(faces)
+
+        if not crops:
+            return results
+
+        # Near-duplicates of recent faces (the same person over consecutive frames) hit the probe cache
+        cache_keys = [coarse_key(crop, box) for crop, box in zip(crops, boxes_seen)]
+        matches = iter(self.face_index.search(face_hashes(crops), k, max_distance=max_distance,
+                                              cache_keys=cache_keys))
+        for faces in results:
+            for face in faces:
+                top = next(matches)
+                face['matches'] = [(student[2], student[1], distance) for student, distance in top]
+                if top and top[0][1] <= self.threshold:
+                    student, distance = top[0]
+                    face.update(student_id=student[2], name=student[1], distance=distance)
+                else:
+                    face.update(student_id="Unknown", name="Unknown",
+                                distance=top[0][1] if top else None)
+        return results
+
+    def detect_faces(self, frame):
+        return self.recognize([frame])[0]
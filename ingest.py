@@ -0,0 +1,275 @@
+import argparse
+import collections
+import logging
+import os
+import queue
+import threading
+import time
+import cv2
+from camera import open_capture
+from config import Config
+from detector import FaceDetector
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Multi-camera ingest. Each source (camera, RTSP/video URL, video file or image folder) has
+# a reader thread that pushes frames into its own small bounded queue; a shared pool of
+# worker threads takes frames round-robin across sources, detects faces and matches them.
+# When workers fall behind, a full queue drops its oldest frame, so memory stays bounded and
+# recognition always works on the newest frames. OpenCV and NumPy release the GIL in
+# detection and matching, so worker threads scale across cores.
+
+
+class FrameQueues:
+    """Per-source bounded frame queues served round-robin; a full queue drops its oldest frame."""
+
+    def __init__(self, maxsize=Config.INGEST_QUEUE_SIZE):
+        self.maxsize = maxsize
+        self._queues = collections.OrderedDict()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = collections.Counter()  # source -> frames dropped
+
+    def add_source(self, source):
+        with self._cond:
+            self._queues[source] = collections.deque()
+
+    def put(self, source, item):
+        """Queue a frame for source, returns True if an older frame was dropped to make room."""
+        with self._cond:
+            frames = self._queues[source]
+            dropped = len(frames) >= self.maxsize
+            if dropped:
+                frames.popleft()
+                self.dropped[source] += 1
+                metrics.incr("frames_dropped")
+            frames.append(item)
+            self._cond.notify()
+            return dropped
+
+    def get(self, timeout=None):
+        """Next (source, item), taking sources in turn; None once closed or on timeout."""
+        with self._cond:
+            while not self._closed:
+                for source, frames in self._queues.items():
+                    if frames:
+                        # Rotate so the next call starts with the following source
+                        self._queues.move_to_end(source)
+                        return source, frames.popleft()
+                if not self._cond.wait(timeout):
+                    return None
+            return None
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class SourceReader(threading.Thread):
+    """Reads one source into the shared FrameQueues; video files and image folders loop."""
+
+    def __init__(self, name, source, frame_queues, fps=None, loop=True, retry_delay=0.05):
+        super().__init__(daemon=True)
+        self.name = name
+        self.source = source
+        self.frame_queues = frame_queues
+        self._is_file = isinstance(source, str) and os.path.isfile(source)
+        if fps is None and (self._is_file or (isinstance(source, str) and os.path.isdir(source))):
+            fps = Config.CAMERA_FPS  # Replay recordings like a live camera; fps=0 reads flat out
+        self.fps = fps
+        self.loop = loop
+        self.retry_delay = retry_delay
+        self.frames_read = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        capture = open_capture(self.source, fps=self.fps)
+        # Video files are paced here; folders pace themselves and cameras by their frame rate
+        interval = 1.0 / self.fps if self.fps and self._is_file else 0
+        next_time = time.monotonic()
+        try:
+            while not self._stop_event.is_set():
+                with metrics.timer("capture"):
+                    ret, frame = capture.read()
+                if not ret:
+                    if self._is_file and self.loop and self.frames_read:
+                        capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    else:
+                        self._stop_event.wait(self.retry_delay)
+                    continue
+                self.frames_read += 1
+                metrics.incr("frames_captured")
+                self.frame_queues.put(self.name, (self.frames_read, time.time(), frame))
+                if interval:
+                    next_time = max(next_time + interval, time.monotonic() - 1.0)
+                    self._stop_event.wait(max(0.0, next_time - time.monotonic()))
+        finally:
+            capture.release()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class IngestPipeline:
+    """Runs several sources through a shared pool of detection/recognition workers.
+
+    Matches are put on self.results as (source, timestamp, student, distance) tuples and,
+    if given, passed to on_match from the worker thread. A student is reported at most once
+    per source every cooldown seconds. Workers never touch the database, so on_match should
+    only queue work (Database.mark_attendance with write-behind is fine). One refresher
+    thread reloads the face index every refresh_interval seconds, so students enrolled
+    while ingest runs are matched too.
+    """
+
+    def __init__(self, face_index, workers=Config.INGEST_WORKERS, queue_size=Config.INGEST_QUEUE_SIZE,
+                 cooldown=Config.AUTO_MARK_COOLDOWN, on_match=None, refresh_interval=Config.INGEST_REFRESH_INTERVAL):
+        self.face_index = face_index
+        self.workers = workers or os.cpu_count() or 1
+        self.cooldown = cooldown
+        self.on_match = on_match
+        self.refresh_interval = refresh_interval
+        self.frame_queues = FrameQueues(queue_size)
+        self.readers = []
+        self.results = queue.Queue()
+        self.processed = collections.Counter()  # source -> frames recognized
+        self._last_reported = {}  # (source, student_id) -> time.monotonic() of the last report
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stop_event = threading.Event()
+
+    def add_source(self, source, name=None, fps=None, loop=True):
+        name = base = name or str(source)
+        names = {reader.name for reader in self.readers}
+        suffix = 2
+        while name in names:
+            name = f"{base}#{suffix}"
+            suffix += 1
+        self.frame_queues.add_source(name)
+        self.readers.append(SourceReader(name, source, self.frame_queues, fps=fps, loop=loop))
+        return name
+
+    def start(self):
+        self.face_index.refresh()
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._work, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if self.refresh_interval:
+            thread = threading.Thread(target=self._refresh_index, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        for reader in self.readers:
+            reader.start()
+
+    def stop(self, timeout=1.0):
+        self._stop_event.set()
+        for reader in self.readers:
+            reader.stop()
+        self.frame_queues.close()
+        for thread in self.readers + self._threads:
+            thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            processed = dict(self.processed)
+        return {reader.name: {'read': reader.frames_read,
+                              'dropped': self.frame_queues.dropped[reader.name],
+                              'processed': processed.get(reader.name, 0)}
+                for reader in self.readers}
+
+    def _refresh_index(self):
+        # The only thread that refreshes; workers keep matching against the previous index meanwhile
+        while not self._stop_event.wait(self.refresh_interval):
+            try:
+                self.face_index.refresh()
+            except Exception:
+                logger.exception("Error refreshing the face index")
+
+    def _work(self):
+        face_detector = FaceDetector()  # Cascade classifiers are per thread
+        while True:
+            item = self.frame_queues.get()
+            if item is None:
+                return
+            source, (seq, timestamp, frame) = item
+            try:
+                self._process(face_detector, source, timestamp, frame)
+            except Exception:
+                logger.exception("Error processing frame %d from %s", seq, source)
+
+    def _process(self, face_detector, source, timestamp, frame):
+        # Frames of one source go to different workers, so no per-source ROI or tracker state
+        boxes = face_detector.detect(frame)
+        matches = []
+        if boxes:
+            crops = [frame[y:y + h, x:x + w] for (x, y, w, h) in boxes]
+            matches = self.face_index.best_matches(crops, refresh=False, boxes=boxes)
+
+        now = time.monotonic()
+        reported = []
+        with self._lock:
+            self.processed[source] += 1
+            for student, distance in matches:
+                if student is None:
+                    metrics.incr("faces_unmatched")
+                    continue
+                metrics.incr("faces_matched")
+                last = self._last_reported.get((source, student[2]))
+                if last is not None and now - last < self.cooldown:
+                    continue
+                self._last_reported[(source, student[2])] = now
+                reported.append((source, timestamp, student, distance))
+
+        for match in reported:
+            self.results.put(match)
+            if self.on_match is not None:
+                self.on_match(*match)
+
+
+if __name__ == '__main__':
+    from datetime import datetime
+    from database import Database, normalize_date
+    from face_index import FaceIndex
+
+    parser = argparse.ArgumentParser(description="Recognize faces from several cameras, streams, videos or image folders")
+    parser.add_argument("sources", nargs="+", help="Camera index, RTSP/video URL, video file or image folder")
+    parser.add_argument("--db", default="attendance_system.db", help="Path to the SQLite database")
+    parser.add_argument("--workers", type=int, default=Config.INGEST_WORKERS, help="Worker threads (default: all cores)")
+    parser.add_argument("--queue-size", type=int, default=Config.INGEST_QUEUE_SIZE, help="Frames buffered per source")
+    parser.add_argument("--fps", type=float, default=None, help="Frame rate for file and folder sources (default: CAMERA_FPS, 0: unthrottled)")
+    parser.add_argument("--seconds", type=float, default=None, help="Stop after this long (default: run until Ctrl+C)")
+    parser.add_argument("--mark", action="store_true", help="Mark attendance for recognized students")
+    args = parser.parse_args()
+    logging.basicConfig(level=Config.LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    db = Database(args.db)
+    face_index = FaceIndex(db)
+
+    def mark(source, timestamp, student, distance):
+        moment = datetime.fromtimestamp(timestamp)
+        db.mark_attendance(student[2], normalize_date(moment.date()), moment.strftime("%H:%M:%S"))
+
+    pipeline = IngestPipeline(face_index, workers=args.workers, queue_size=args.queue_size,
+                              on_match=mark if args.mark else None)
+    for source in args.sources:
+        pipeline.add_source(source, fps=args.fps)
+
+    start = time.monotonic()
+    pipeline.start()
+    try:
+        while args.seconds is None or time.monotonic() - start < args.seconds:
+            time.sleep(1.0)
+            while not pipeline.results.empty():
+                source, timestamp, student, distance = pipeline.results.get_nowait()
+                print(f"{source}: {student[1]} ({student[2]}) distance {distance}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pipeline.stop()
+        elapsed = time.monotonic() - start
+        for name, counts in pipeline.stats().items():
+            print(f"{name}: read {counts['read']}, processed {counts['processed']} "
+                  f"({counts['processed'] / elapsed:.1f} fps), dropped {counts['dropped']}")
+        db.close()
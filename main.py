@@ -1,15 +1,25 @@
+import time
+_STARTED = time.perf_counter()  # For --startup-time; taken before any other import
+import argparse
 import tkinter as tk
 from tkinter import ttk, messagebox
-import cv2
-import numpy as np
-from PIL import Image, ImageTk
 from datetime import datetime, date
-from database import Database  # Assuming you have this file
+from database import get_database, normalize_date
+from paged_view import PagedTreeview, keyset_page
+from report_export import export_report, parquet_available
+from config import Config
+from metrics import start_export
 import os
-from tkcalendar import Calendar
-import csv
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import filedialog
-import imagehash  # You might need to install this: pip install imagehash
+
+# OpenCV, NumPy, PIL, tkcalendar and the face modules are imported where they are first
+# needed, or by the warm-up thread once the home screen is up, so the window paints first.
+
+logger = logging.getLogger(__name__)
 
 class AttendanceApp:
     def __init__(self, root):
@@ -38,15 +48,20 @@ class AttendanceApp:
         self.style.configure('Treeview', font=('Segoe UI', 10), foreground="#333")
         self.style.configure('Treeview.Heading', font=('Segoe UI', 11, 'bold'), foreground="#2c3e50")
 
-        # Initialize systems
-        self.db = Database()
-        self.face_cascade = cv2.CascadeClassifier(
-            cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-        )
+        # Database, recognizer and camera are created on first use or by the warm-up thread
+        self._db = None  # Shared with any other module in this process
+        self._recognizer = None  # Enrolled face templates, rebuilt when students change
+        self._camera = None  # Stays open across screens, released after an idle timeout
+        self._warm_up_thread = None
+        # Report exports stream from the database on one long-lived worker thread
+        self.export_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="export")
+        self.warm_up_seconds = None
         self.captured_face = None
-        self.video_capture = None
+        self.frame_grabber = None  # Set while the current screen is subscribed to the camera
+        self._shown_frame_seq = 0
+        self.auto_recognizer = None  # Running only while hands-free mode is on
         self.current_attendance = {}
-        self.selected_date = date.today()
+        self.selected_date = normalize_date(date.today())
         self.attendance_capture = None  # To store the captured image for attendance
 
         # Create menu
@@ -58,10 +73,71 @@ class AttendanceApp:
 
         # Show home frame by default
         self.show_home_frame()
+        # Load the heavy parts once the home screen has painted
+        self.root.after(Config.STARTUP_WARMUP_DELAY_MS, self.start_warm_up)
+
+        # Metrics snapshots to a file or local port, if configured
+        self.metrics_exporter = start_export()
 
         # Handle window close
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
 
+    @property
+    def db(self):
+        if self._db is None:
+            self._db = get_database()
+        return self._db
+
+    @property
+    def recognizer(self):
+        if self._recognizer is None:
+            self.wait_for_warm_up()
+            if self._recognizer is None:  # Warm-up failed, let the error surface here
+                from face_utils import FaceRecognizer
+                self._recognizer = FaceRecognizer(self.db)
+        return self._recognizer
+
+    @property
+    def face_detector(self):
+        return self.recognizer.face_detector
+
+    @property
+    def face_index(self):
+        return self.recognizer.face_index
+
+    @property
+    def camera(self):
+        if self._camera is None:
+            from camera import CameraManager
+            self._camera = CameraManager()
+        return self._camera
+
+    def start_warm_up(self):
+        """Open the database, import the imaging modules and load the recognizer in the background."""
+        if self._warm_up_thread is None:
+            self._warm_up_thread = threading.Thread(target=self._warm_up, daemon=True)
+            self._warm_up_thread.start()
+
+    def wait_for_warm_up(self):
+        self.start_warm_up()
+        self._warm_up_thread.join()
+
+    def _warm_up(self):
+        start = time.perf_counter()
+        try:
+            self._db = get_database()  # Runs any migrations off the Tk thread
+            from PIL import ImageTk  # noqa: F401, warms the module cache for the video screens
+            from tkcalendar import Calendar  # noqa: F401
+            from face_quality import best_face  # noqa: F401
+            from face_utils import FaceRecognizer
+            # Loads the Haar cascade and builds the face index; the Tk thread waits for this
+            # in the recognizer property rather than building a second one
+            self._recognizer = FaceRecognizer(self._db)
+        except Exception:
+            logger.exception("Warm-up failed")
+        self.warm_up_seconds = time.perf_counter() - start
+        logger.debug("Warm-up took %.3fs", self.warm_up_seconds)
+
     def create_menu(self):
         menubar = tk.Menu(self.root, bg="#f0f0f0", fg="black")
 
@@ -108,10 +184,15 @@ class AttendanceApp:
             "reports": "📊"
         }
 
-        ttk.Button(action_frame, text=f"{icons['register']} Register Student",
-                   command=self.show_registration_window, style="TButton", width=25).pack(pady=10)
-        ttk.Button(action_frame, text=f"{icons['attendance']} Mark Attendance",
-                   command=self.show_attendance_date_picker, style="TButton", width=25).pack(pady=10)
+        register_btn = ttk.Button(action_frame, text=f"{icons['register']} Register Student",
+                                  command=self.show_registration_window, style="TButton", width=25)
+        register_btn.pack(pady=10)
+        attendance_btn = ttk.Button(action_frame, text=f"{icons['attendance']} Mark Attendance",
+                                    command=self.show_attendance_date_picker, style="TButton", width=25)
+        attendance_btn.pack(pady=10)
+        # Pointing at a camera screen is a good hint it is about to be opened
+        for button in (register_btn, attendance_btn):
+            button.bind("<Enter>", lambda event: self.start_warm_up(), add="+")
         ttk.Button(action_frame, text=f"{icons['students']} View Students",
                    command=self.show_students_frame, style="TButton", width=25).pack(pady=10)
         ttk.Button(action_frame, text=f"{icons['reports']} View Reports",
@@ -167,45 +248,81 @@ class AttendanceApp:
         back_btn.pack(side=tk.LEFT, padx=10)
 
         # Start video feed
-        self.video_capture = cv2.VideoCapture(0)
+        self.start_video_capture()
         self.update_video_feed()
 
-    def update_video_feed(self):
-        if self.video_capture is None or not self.video_capture.isOpened():
-            print("Video capture is not initialized or opened.")
+    def start_video_capture(self):
+        if self.frame_grabber is None:
+            self.frame_grabber = self.camera.subscribe()
+        self._shown_frame_seq = 0
+
+    def stop_video_capture(self):
+        if self.frame_grabber is not None:
+            self.camera.unsubscribe()
+            self.frame_grabber = None
+
+    def _show_latest_frame(self, label):
+        from PIL import ImageTk
+        # Only blit when the capture thread has produced a new frame since the last paint
+        seq, _, image = self.frame_grabber.latest.get()
+        if seq == self._shown_frame_seq or image is None:
             return
+        self._shown_frame_seq = seq
+        try:
+            imgtk = ImageTk.PhotoImage(image=image)
+            label.imgtk = imgtk
+            label.configure(image=imgtk)
+        except Exception as e:
+            logger.error("Error processing video frame: %s", e)
 
-        ret, frame = self.video_capture.read()
-        print(f"ret: {ret}")
-        if ret:
-            try:
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                img = Image.fromarray(frame)
-                imgtk = ImageTk.PhotoImage(image=img)
-
-                self.video_label.imgtk = imgtk
-                self.video_label.configure(image=imgtk)
-            except Exception as e:
-                print(f"Error processing video frame: {e}")
-        else:
-            print("Failed to read frame from video capture.")
+    def update_video_feed(self):
+        # Stop when the capture was closed or the screen was navigated away from
+        if self.frame_grabber is None or not self.video_label.winfo_exists():
+            return
 
-        self.video_label.after(10, self.update_video_feed)
+        self._show_latest_frame(self.video_label)
+        self.video_label.after(int(1000 / Config.DISPLAY_FPS), self.update_video_feed)
 
     def capture_face(self):
-        ret, frame = self.video_capture.read()
-        if ret:
-            self.captured_face = frame
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
+        self._capture_burst(self.capture_btn, self._on_face_burst)
 
-            if len(faces) > 0:
-                self.register_btn.config(state=tk.NORMAL)
-                messagebox.showinfo("Success", "Face captured successfully!")
-            else:
-                messagebox.showerror("Error", "No face detected in the image!")
-        else:
+    def _on_face_burst(self, frames):
+        if not frames:
             messagebox.showerror("Error", "Failed to capture image")
+            return
+
+        # Keep the sharpest, best lit frontal frame of the burst; enrollments must pass the gate
+        from face_quality import best_face
+        frame, box, quality = best_face(frames, self.face_detector)
+        if frame is None:
+            messagebox.showerror("Error", "Multiple faces detected in the image!" if quality == "multiple faces"
+                                 else "No face detected in the image!")
+        elif not quality['passed']:
+            messagebox.showerror("Error", f"Face image rejected: {', '.join(quality['issues'])}. Please try again.")
+        else:
+            self.captured_face = frame
+            self.register_btn.config(state=tk.NORMAL)
+            messagebox.showinfo("Success", "Face captured successfully!")
+
+    def _capture_burst(self, button, on_frames):
+        # The grabber thread collects the burst while the Tk loop keeps running; the button
+        # stays disabled until on_frames(frames) has been called with the result
+        if self.frame_grabber is None:
+            on_frames([])
+            return
+        button.config(state=tk.DISABLED)
+        future = self.frame_grabber.grab_burst(Config.QUALITY_BURST_FRAMES, Config.QUALITY_BURST_TIMEOUT)
+        self.root.after(10, self._poll_burst, button, future, on_frames)
+
+    def _poll_burst(self, button, future, on_frames):
+        # Drop the result when the screen was navigated away from meanwhile
+        if not button.winfo_exists():
+            return
+        if not future.done():
+            self.root.after(10, self._poll_burst, button, future, on_frames)
+            return
+        button.config(state=tk.NORMAL)
+        on_frames(future.result())
 
     def register_student(self):
         name = self.name_entry.get().strip()
@@ -224,6 +341,7 @@ class AttendanceApp:
             # Save the face image
             face_filename = f"faces/{student_id}.jpg"
             os.makedirs("faces", exist_ok=True)
+            import cv2
             cv2.imwrite(face_filename, self.captured_face)
 
             # Save to database
@@ -249,6 +367,7 @@ class AttendanceApp:
         ttk.Label(search_frame, text="Search:", style="TLabel").pack(side=tk.LEFT)
         self.search_entry = ttk.Entry(search_frame, width=40, style="TEntry")
         self.search_entry.pack(side=tk.LEFT, padx=10, fill=tk.X, expand=True)
+        self.search_entry.bind("<Return>", lambda event: self.search_students())
         ttk.Button(search_frame, text="🔍 Search",
                    command=self.search_students, style="TButton", width=10).pack(side=tk.LEFT, padx=5)
         ttk.Button(search_frame, text="🔄 Refresh",
@@ -278,8 +397,9 @@ class AttendanceApp:
 
         self.student_tree.pack(fill=tk.BOTH, expand=True)
 
-        # Configure scrollbar
-        scrollbar.config(command=self.student_tree.yview)
+        # Rows are loaded a page at a time as the list is scrolled
+        self.student_pager = PagedTreeview(self.student_tree, scrollbar,
+                                           row_values=lambda student: (student[2], student[1], student[4] or ""))
 
         # Load data
         self.load_student_data()
@@ -292,33 +412,22 @@ class AttendanceApp:
                    command=self.show_home_frame, style="TButton", width=10).pack(side=tk.LEFT, padx=10)
 
     def load_student_data(self):
-        # Clear existing data
-        for item in self.student_tree.get_children():
-            self.student_tree.delete(item)
-
-        # Get students from database
-        students = self.db.get_all_students()
-
-        # Add to treeview
-        for student in students:
-            self.student_tree.insert("", tk.END, values=(student[2], student[1], student[4]))
+        self.student_pager.reset(
+            lambda after, limit: keyset_page(self.db.get_students_page(after, limit), limit,
+                                             key=lambda student: student[0]))
 
     def search_students(self):
-        query = self.search_entry.get().lower()
+        query = self.search_entry.get().strip()
         if not query:
             self.load_student_data()
             return
 
-        # Clear existing data
-        for item in self.student_tree.get_children():
-            self.student_tree.delete(item)
+        def fetch_page(offset, limit):
+            offset = offset or 0
+            students = self.db.search_students(query, limit, offset)
+            return students, (offset + limit if len(students) == limit else None)
 
-        students = self.db.get_all_students()
-        for student in students:
-            if (query in student[1].lower() or  # Name
-                    query in student[2].lower() or  # Student ID
-                    query in student[4].lower()):  # Class
-                self.student_tree.insert("", tk.END, values=(student[2], student[1], student[4]))
+        self.student_pager.reset(fetch_page)
 
     def show_attendance_date_picker(self):
         self.clear_main_frame()
@@ -332,7 +441,8 @@ class AttendanceApp:
         cal_frame.pack(pady=30)
 
         # Calendar widget with improved styling
-        self.cal = Calendar(cal_frame, selectmode='day',
+        from tkcalendar import Calendar
+        self.cal = Calendar(cal_frame, selectmode='day', date_pattern='yyyy-mm-dd',
                             year=date.today().year,
                             month=date.today().month,
                             day=date.today().day,
@@ -358,7 +468,8 @@ class AttendanceApp:
 
     def show_attendance_frame(self):
         self.clear_main_frame()
-        self.current_attendance = {}
+        # Seed from the database so students marked before a restart aren't marked again
+        self.current_attendance = {student_id: True for student_id in self.db.get_marked_student_ids(self.selected_date)}
         self.attendance_capture = None
 
         # Header
@@ -381,6 +492,10 @@ class AttendanceApp:
                                                 command=self.capture_attendance_face, width=25)
         self.capture_attendance_btn.pack(pady=5)
 
+        self.auto_mode_btn = tk.Button(button_frame, text="▶ Start Auto Mode",
+                                       command=self.toggle_auto_attendance, width=25)
+        self.auto_mode_btn.pack(pady=5)
+
         back_btn = tk.Button(button_frame, text="⬅ Back",
                                command=self.show_home_frame, width=10)
         back_btn.pack(pady=5)
@@ -415,87 +530,102 @@ class AttendanceApp:
         self.main_frame.grid_rowconfigure(2, weight=1)
 
         # Start video
-        self.video_capture = cv2.VideoCapture(0)
+        self.start_video_capture()
         self.update_attendance_video()
 
     def update_attendance_video(self):
-        if self.video_capture is None or not self.video_capture.isOpened():
-            print("Video capture is not initialized or opened.")
+        # Stop when the capture was closed or the screen was navigated away from
+        if self.frame_grabber is None or not self.attendance_video_label.winfo_exists():
             return
 
-        ret, frame = self.video_capture.read()
-        print(f"ret: {ret}")
-        if ret:
-            try:
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                img = Image.fromarray(frame)
-                imgtk = ImageTk.PhotoImage(image=img)
-
-                self.attendance_video_label.imgtk = imgtk
-                self.attendance_video_label.configure(image=imgtk)
-            except Exception as e:
-                print(f"Error processing video frame: {e}")
-        else:
-            print("Failed to read frame from video capture.")
-
-        self.attendance_video_label.after(10, self.update_attendance_video)
+        self._show_latest_frame(self.attendance_video_label)
+        self.attendance_video_label.after(int(1000 / Config.DISPLAY_FPS), self.update_attendance_video)
 
     def capture_attendance_face(self):
-        ret, frame = self.video_capture.read()
-        if ret:
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
-            if len(faces) == 1:
-                x, y, w, h = faces[0]
-                self.attendance_capture = frame[y:y + h, x:x + w]
-                self.compare_captured_face()
-            elif len(faces) > 1:
-                messagebox.showerror("Error", "Multiple faces detected. Please ensure only one person is in front of the camera.")
-            else:
-                messagebox.showerror("Error", "No face detected. Please try again.")
-        else:
+        self._capture_burst(self.capture_attendance_btn, self._on_attendance_burst)
+
+    def _on_attendance_burst(self, frames):
+        if not frames:
             messagebox.showerror("Error", "Could not capture frame.")
+            return
+
+        # Match the best frame of the burst; unlike enrollment a weak frame is still tried
+        from face_quality import best_face
+        frame, box, reason = best_face(frames, self.face_detector)
+        if frame is not None:
+            x, y, w, h = box
+            self.attendance_capture = frame[y:y + h, x:x + w]
+            self.compare_captured_face()
+        elif reason == "multiple faces":
+            messagebox.showerror("Error", "Multiple faces detected. Please ensure only one person is in front of the camera.")
+        else:
+            messagebox.showerror("Error", "No face detected. Please try again.")
 
     def compare_captured_face(self):
         if self.attendance_capture is None:
             messagebox.showerror("Error", "No face captured for comparison.")
             return
 
-        captured_face_gray = cv2.cvtColor(self.attendance_capture, cv2.COLOR_BGR2GRAY)
-        captured_face_resized = cv2.resize(captured_face_gray, (100, 100))  # Standardize size
-
-        students = self.db.get_all_students()
-        for student in students:
-            face_path = student[3]
-            if os.path.exists(face_path):
-                try:
-                    registered_face = cv2.imread(face_path, cv2.IMREAD_GRAYSCALE)
-                    registered_face_resized = cv2.resize(registered_face, (100, 100))
-
-                    # Using image hashing for comparison (requires 'imagehash' library)
-                    captured_hash = imagehash.average_hash(Image.fromarray(captured_face_resized))
-                    registered_hash = imagehash.average_hash(Image.fromarray(registered_face_resized))
-
-                    # Hamming distance for similarity (lower is more similar)
-                    hamming_distance = captured_hash - registered_hash
-                    similarity_threshold = 10  # Adjust this value based on experimentation
-
-                    if hamming_distance <= similarity_threshold:
-                        current_time = datetime.now().strftime("%H:%M:%S")
-                        if student[2] not in self.current_attendance:
-                            self.db.mark_attendance(student[2], self.selected_date, time_in=current_time)
-                            self.current_attendance[student[2]] = True
-                            self._update_attendance_log(f"{student[1]} ({student[2]}) - Present (Face Match) at {current_time}\n")
-                            messagebox.showinfo("Success", f"Attendance marked for {student[1]} ({student[2]})")
-                            return  # Exit after first match
-                        else:
-                            messagebox.showinfo("Info", f"Attendance already marked for {student[1]} today.")
-                            return
-
-                except Exception as e:
-                    print(f"Error comparing face for {student[1]}: {e}")
-
-        messagebox.showerror("Error", "No matching face found.")
+        face = self.recognizer.recognize([self.attendance_capture], detect=False)[0][0]
+        if face['student_id'] == "Unknown":
+            messagebox.showerror("Error", "No matching face found.")
+            return
+
+        name, student_id = face['name'], face['student_id']
+        current_time = datetime.now().strftime("%H:%M:%S")
+        if student_id not in self.current_attendance:
+            self.db.mark_attendance(student_id, self.selected_date, time_in=current_time)
+            self.current_attendance[student_id] = True
+            self._update_attendance_log(f"{name} ({student_id}) - Present (Face Match) at {current_time}\n")
+            messagebox.showinfo("Success", f"Attendance marked for {name} ({student_id})")
+        else:
+            messagebox.showinfo("Info", f"Attendance already marked for {name} today.")
+
+    def toggle_auto_attendance(self):
+        if self.auto_recognizer is None:
+            self.start_auto_attendance()
+        else:
+            self.stop_auto_attendance()
+
+    def start_auto_attendance(self):
+        if self.frame_grabber is None or self.auto_recognizer is not None:
+            return
+        # Build the index here; the worker thread only reads it
+        from auto_attendance import ContinuousRecognizer
+        self.face_index.refresh()
+        self.auto_recognizer = ContinuousRecognizer(self.frame_grabber, self.face_index)
+        self.auto_recognizer.start()
+        self.auto_mode_btn.config(text="⏸ Stop Auto Mode")
+        self._update_attendance_log("Auto mode started - recognizing everyone in view\n")
+        self._poll_auto_attendance()
+
+    def stop_auto_attendance(self):
+        if self.auto_recognizer is None:
+            return
+        self.auto_recognizer.stop()
+        self.auto_recognizer = None
+        if self.auto_mode_btn.winfo_exists():
+            self.auto_mode_btn.config(text="▶ Start Auto Mode")
+            self._update_attendance_log("Auto mode stopped\n")
+
+    def _poll_auto_attendance(self):
+        if self.auto_recognizer is None:
+            return
+
+        while True:
+            try:
+                student, distance = self.auto_recognizer.results.get_nowait()
+            except queue.Empty:
+                break
+            if student[2] in self.current_attendance:
+                continue
+            current_time = datetime.now().strftime("%H:%M:%S")
+            self.db.mark_attendance(student[2], self.selected_date, time_in=current_time)
+            self.current_attendance[student[2]] = True
+            self._update_attendance_log(f"{student[1]} ({student[2]}) - Present (Auto) at {current_time}\n")
+
+        self.face_index.refresh()  # Cheap unless students changed
+        self.root.after(Config.AUTO_POLL_INTERVAL_MS, self._poll_auto_attendance)
 
     def _update_attendance_log(self, message):
         self.attendance_log.config(state=tk.NORMAL)
@@ -505,35 +635,24 @@ class AttendanceApp:
 
     def manual_attendance(self):
         student_id = self.manual_id_entry.get().strip()
-        print(f"Manual Attendance - Entered Student ID: '{student_id}'")
-        print(f"Manual Attendance - Selected Date: '{self.selected_date}'")
+        if not student_id:
+            logger.debug("Manual attendance: student ID field is empty")
+            return
 
-        if student_id:
-            current_time = datetime.now().strftime("%H:%M:%S")
-            print(f"Manual Attendance - Current Time: '{current_time}'")
-
-            student_data = self.db.get_student(student_id)
-            print(f"Manual Attendance - Student Data from DB: {student_data}")
-
-            if student_data:
-                if student_id not in self.current_attendance:
-                    print(f"Manual Attendance - Marking attendance for ID: '{student_id}'")
-                    self.db.mark_attendance(student_id, self.selected_date, time_in=current_time)
-                    print("Manual Attendance - mark_attendance() called")
-                    self.current_attendance[student_id] = True
-                    print(f"Manual Attendance - current_attendance updated: {self.current_attendance}")
-                    self._update_attendance_log(f"{student_data[1]} ({student_id}) - Present at {current_time}\n")
-                    print("Manual Attendance - _update_attendance_log() called")
-                    self.manual_id_entry.delete(0, tk.END)
-                    print("Manual Attendance - Entry field cleared")
-                else:
-                    messagebox.showinfo("Info", "Attendance already marked for this student today")
-                    print("Manual Attendance - Already marked")
-            else:
-                messagebox.showerror("Error", "Student ID not found")
-                print("Manual Attendance - Student ID not found")
+        current_time = datetime.now().strftime("%H:%M:%S")
+        student_data = self.db.get_student(student_id)
+        if not student_data:
+            logger.info("Manual attendance: student ID %r not found", student_id)
+            messagebox.showerror("Error", "Student ID not found")
+        elif student_id in self.current_attendance:
+            logger.debug("Manual attendance: %r already marked for %s", student_id, self.selected_date)
+            messagebox.showinfo("Info", "Attendance already marked for this student today")
         else:
-            print("Manual Attendance - Student ID field is empty")
+            logger.debug("Manual attendance: marking %r for %s at %s", student_id, self.selected_date, current_time)
+            self.db.mark_attendance(student_id, self.selected_date, time_in=current_time)
+            self.current_attendance[student_id] = True
+            self._update_attendance_log(f"{student_data[1]} ({student_id}) - Present at {current_time}\n")
+            self.manual_id_entry.delete(0, tk.END)
             
     def show_reports_frame(self):
         self.clear_main_frame()
@@ -580,13 +699,17 @@ class AttendanceApp:
         self.report_tree.column("Date", width=120, anchor=tk.W)
         self.report_tree.column("Time In", width=120, anchor=tk.W)
 
+        scrollbar = ttk.Scrollbar(report_frame)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.report_tree.pack(fill=tk.BOTH, expand=True)
+        self.report_pager = PagedTreeview(self.report_tree, scrollbar, row_values=lambda record: record[:4])
+        self.report_range = None
 
         # Button frame
         button_frame = ttk.Frame(self.main_frame)
         button_frame.pack(pady=20)
 
-        ttk.Button(button_frame, text="📄 Export to CSV",
+        ttk.Button(button_frame, text="📄 Export",
                    command=self.export_report, style="TButton", width=15).pack(side=tk.LEFT, padx=10)
         ttk.Button(button_frame, text="⬅ Back",
                    command=self.show_home_frame, style="TButton", width=10).pack(side=tk.LEFT, padx=10)
@@ -606,33 +729,38 @@ class AttendanceApp:
             messagebox.showerror("Error", "Invalid date format (YYYY-MM-DD)")
             return
 
-        # Clear existing data
-        for item in self.report_tree.get_children():
-            self.report_tree.delete(item)
-
-        # Get report data
-        report_data = self.db.get_attendance_report(start_date, end_date)
-
-        # Add to treeview
-        for record in report_data:
-            self.report_tree.insert("", tk.END, values=record)
+        # Pages are fetched off the UI thread as the report is scrolled
+        self.report_range = (start_date, end_date)
+        self.report_pager.reset(
+            lambda after, limit: keyset_page(self.db.get_attendance_report_page(start_date, end_date, after, limit),
+                                             limit, key=lambda record: (record[2], record[3], record[4])))
 
     def export_report(self):
+        if self.report_range is None:
+            messagebox.showerror("Error", "Please generate a report first")
+            return
+
+        filetypes = [("CSV files", "*.csv")]
+        if parquet_available():
+            filetypes.append(("Parquet files", "*.parquet"))
         file_path = filedialog.asksaveasfilename(defaultextension=".csv",
-                                                 filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+                                                 filetypes=filetypes + [("All files", "*.*")])
         if file_path:
-            report_data = []
-            for item in self.report_tree.get_children():
-                report_data.append(self.report_tree.item(item, 'values'))
-
-            try:
-                with open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
-                    writer = csv.writer(csvfile)
-                    writer.writerow(["Student Name", "Student ID", "Date", "Time In"])  # Write header
-                    writer.writerows(report_data)
-                messagebox.showinfo("Success", f"Report exported to {file_path}")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to export report: {e}")
+            # Stream straight from the database on a worker thread; the tree only holds
+            # the pages scrolled so far and large exports would freeze the window
+            start_date, end_date = self.report_range
+            future = self.export_executor.submit(export_report, self.db, file_path, start_date, end_date)
+            self.root.after(100, self._poll_export, file_path, future)
+
+    def _poll_export(self, file_path, future):
+        if not future.done():
+            self.root.after(100, self._poll_export, file_path, future)
+            return
+        error = future.exception()
+        if error is not None:
+            messagebox.showerror("Error", f"Failed to export report: {error}")
+        else:
+            messagebox.showinfo("Success", f"Exported {future.result()} rows to {file_path}")
 
     def _show_calendar(self, entry_widget):
         def set_date():
@@ -645,7 +773,8 @@ class AttendanceApp:
         top.title("Select Date")
 
         today = date.today()
-        cal = Calendar(top, selectmode='day',
+        from tkcalendar import Calendar
+        cal = Calendar(top, selectmode='day', date_pattern='yyyy-mm-dd',
                        year=today.year,
                        month=today.month,
                        day=today.day,
@@ -662,18 +791,40 @@ class AttendanceApp:
         for widget in self.main_frame.winfo_children():
             widget.destroy()
 
-        # Release camera if active
-        if self.video_capture and self.video_capture.isOpened():
-            self.video_capture.release()
-            self.video_capture = None
+        # Leave the camera to the manager; it closes after sitting idle
+        self.stop_auto_attendance()
+        self.stop_video_capture()
 
     def on_closing(self):
         """Clean up resources when closing the application"""
-        if self.video_capture and self.video_capture.isOpened():
-            self.video_capture.release()
+        self.stop_auto_attendance()
+        self.stop_video_capture()
+        if self._camera is not None:
+            self._camera.close()
+        if self._warm_up_thread is not None:
+            self._warm_up_thread.join()
+        self.export_executor.shutdown()  # Let a running export finish before the database closes
+        if self._db is not None:
+            self._db.close()  # Flushes queued attendance marks
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.stop()
         self.root.destroy()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Student attendance system")
+    parser.add_argument("--startup-time", action="store_true",
+                        help="Print the time to first paint and to a loaded recognizer, then exit")
+    args = parser.parse_args()
+    logging.basicConfig(level=Config.LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
     root = tk.Tk()
     app = AttendanceApp(root)
-    root.mainloop()
\ No newline at end of file
+    if args.startup_time:
+        root.wait_visibility(app.main_frame)
+        root.update_idletasks()
+        print(f"Time to first paint: {(time.perf_counter() - _STARTED) * 1000:.0f} ms")
+        app.wait_for_warm_up()
+        print(f"Warm-up (database, OpenCV, face index): {app.warm_up_seconds * 1000:.0f} ms, "
+              f"ready {(time.perf_counter() - _STARTED) * 1000:.0f} ms after start")
+        app.on_closing()
+    else:
+        root.mainloop()
\ No newline at end of file
@@ -0,0 +1,207 @@
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from config import Config
+
+# Process-wide counters and latency histograms for the hot paths (capture, detect, match,
+# database). Every call is one attribute check when disabled, so instrumentation can stay
+# in per-frame code. snapshot() returns plain dicts; start_export() writes them to a JSON
+# file and/or serves them on a local port, and service.py exposes them at /metrics.
+
+logger = logging.getLogger(__name__)
+
+# Upper bucket bounds in milliseconds; the last bucket takes everything slower
+HISTOGRAM_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class _Histogram:
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms):
+        self.counts[bisect.bisect_left(HISTOGRAM_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, fraction):
+        # Upper bound of the bucket holding the requested rank (max for the overflow bucket)
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(HISTOGRAM_BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count if self.count else 0.0,
+            'p50_ms': self.percentile(0.50),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'max_ms': self.max,
+            'buckets': dict(zip([str(bound) for bound in HISTOGRAM_BUCKETS_MS] + ["inf"], self.counts)),
+        }
+
+
+class _Timer:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    """Thread-safe named counters and latency histograms."""
+
+    def __init__(self, enabled=Config.METRICS_ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._started = time.time()
+
+    def incr(self, name, amount=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def observe(self, name, seconds):
+        """Record one latency sample, in seconds, in the histogram called name."""
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = _Histogram()
+            histogram.add(seconds * 1000)
+
+    def timer(self, name):
+        """Context manager that observes the time spent in its block."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'time': time.time(),
+                'uptime_s': time.time() - self._started,
+                'enabled': self.enabled,
+                'counters': dict(self._counters),
+                'latency': {name: histogram.summary() for name, histogram in self._histograms.items()},
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._started = time.time()
+
+
+metrics = Metrics()
+
+
+def write_snapshot(path, snapshot=None):
+    """Write a snapshot to path as JSON, replacing the previous one atomically."""
+    snapshot = snapshot or metrics.snapshot()
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f, indent=2)
+    os.replace(temp_path, path)
+
+
+class MetricsExporter(threading.Thread):
+    """Writes a snapshot to path every interval seconds and/or serves them on a local port."""
+
+    def __init__(self, path=None, port=None, host="127.0.0.1", interval=Config.METRICS_EXPORT_INTERVAL):
+        super().__init__(daemon=True)
+        self.path = path
+        self.interval = interval
+        self.server = _snapshot_server(host, port) if port is not None else None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        if self.server is not None:
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        while self.path and not self._stop_event.wait(self.interval):
+            self._write()
+
+    def stop(self):
+        self._stop_event.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        if self.path:
+            self._write()  # Final snapshot on shutdown
+
+    def _write(self):
+        try:
+            write_snapshot(self.path)
+        except OSError as e:
+            logger.warning("Could not write metrics to %s: %s", self.path, e)
+
+
+def _snapshot_server(host, port):
+    # http.server is imported here, it is slow to import and most processes never serve
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class SnapshotHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip('/') not in ("", "/metrics"):
+                self.send_error(404)
+                return
+            body = json.dumps(metrics.snapshot()).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug("metrics endpoint: " + format, *args)
+
+    return ThreadingHTTPServer((host, port), SnapshotHandler)
+
+
+def start_export(path=Config.METRICS_FILE, port=Config.METRICS_PORT):
+    """Start exporting snapshots as configured; returns the exporter, or None if nothing is."""
+    if not metrics.enabled or (not path and port is None):
+        return None
+    exporter = MetricsExporter(path=path, port=port)
+    exporter.start()
+    return exporter
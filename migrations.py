@@ -0,0 +1,310 @@
+import sqlite3
+
+# Versioned schema migrations for the attendance database. The applied version is kept in
+# SQLite's PRAGMA user_version; each migration runs in its own transaction together with the
+# version bump, so a failed upgrade leaves the database at the last good version.
+
+
+def _columns(conn, table):
+    return [column[1] for column in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def create_base_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS students (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            student_id TEXT UNIQUE NOT NULL,
+            face_image_path TEXT,
+            class TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS attendance (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id TEXT NOT NULL,
+            attendance_date DATE NOT NULL,
+            time_in TEXT NOT NULL,
+            FOREIGN KEY (student_id) REFERENCES students(student_id)
+        )
+    """)
+
+
+def add_face_template_columns(conn):
+    # Databases created by earlier versions may already have these from the old ad-hoc upgrade
+    columns = _columns(conn, "students")
+    if "face_template" not in columns:
+        conn.execute("ALTER TABLE students ADD COLUMN face_template BLOB")
+    if "template_model" not in columns:
+        conn.execute("ALTER TABLE students ADD COLUMN template_model TEXT")
+
+
+def unique_daily_attendance(conn):
+    # SQLite cannot add a constraint in place, so rebuild the table keeping the earliest
+    # mark of each student per day, then index it for date lookups and range reports
+    conn.execute("""
+        CREATE TABLE attendance_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id TEXT NOT NULL,
+            attendance_date DATE NOT NULL,
+            time_in TEXT NOT NULL,
+            FOREIGN KEY (student_id) REFERENCES students(student_id),
+            UNIQUE (student_id, attendance_date)
+        )
+    """)
+    conn.execute("""
+        INSERT INTO attendance_new (id, student_id, attendance_date, time_in)
+        SELECT id, student_id, attendance_date, MIN(time_in)
+        FROM attendance
+        GROUP BY student_id, attendance_date
+    """)
+    conn.execute("DROP TABLE attendance")
+    conn.execute("ALTER TABLE attendance_new RENAME TO attendance")
+    conn.execute("CREATE INDEX idx_attendance_date_time ON attendance (attendance_date, time_in)")
+
+
+def student_search_index(conn):
+    # External-content FTS5 index over students, kept in sync by triggers; prefix='2 3'
+    # stores short prefixes so "kr"* style queries are index lookups
+    try:
+        conn.execute("""
+            CREATE VIRTUAL TABLE students_fts USING fts5(
+                name, student_id, class,
+                content='students', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        if "fts5" not in str(e):
+            raise
+        return  # SQLite built without FTS5; Database.search_students falls back to LIKE
+    conn.execute("""
+        CREATE TRIGGER students_fts_insert AFTER INSERT ON students BEGIN
+            INSERT INTO students_fts (rowid, name, student_id, class)
+            VALUES (new.id, new.name, new.student_id, new.class);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER students_fts_delete AFTER DELETE ON students BEGIN
+            INSERT INTO students_fts (students_fts, rowid, name, student_id, class)
+            VALUES ('delete', old.id, old.name, old.student_id, old.class);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER students_fts_update AFTER UPDATE OF name, student_id, class ON students BEGIN
+            INSERT INTO students_fts (students_fts, rowid, name, student_id, class)
+            VALUES ('delete', old.id, old.name, old.student_id, old.class);
+            INSERT INTO students_fts (rowid, name, student_id, class)
+            VALUES (new.id, new.name, new.student_id, new.class);
+        END
+    """)
+    conn.execute("INSERT INTO students_fts (students_fts) VALUES ('rebuild')")
+
+
+def students_revision(conn):
+    # Counter bumped by every change to students, so processes can tell whether a cached copy
+    # of the students (like template_store.TemplateStore) is current with a single-row read.
+    # database_id tells apart databases whose counters happen to be equal.
+    conn.execute("""
+        CREATE TABLE students_revision (
+            revision INTEGER NOT NULL,
+            database_id TEXT NOT NULL
+        )
+    """)
+    conn.execute("INSERT INTO students_revision VALUES (0, lower(hex(randomblob(8))))")
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        conn.execute(f"""
+            CREATE TRIGGER students_revision_{event.lower()} AFTER {event} ON students BEGIN
+                UPDATE students_revision SET revision = revision + 1;
+            END
+        """)
+
+
+def attendance_summaries(conn):
+    # Pre-aggregated attendance kept current by triggers, so dashboards read a few hundred
+    # summary rows instead of scanning attendance: per class per day totals with the first
+    # arrival, and per student per term day counts. A row's class is the student's class
+    # when the mark was made. Terms are date ranges added with Database.add_term.
+    conn.execute("""
+        CREATE TABLE attendance_class_daily (
+            attendance_date DATE NOT NULL,
+            class TEXT NOT NULL,
+            present INTEGER NOT NULL,
+            first_time_in TEXT NOT NULL,
+            PRIMARY KEY (attendance_date, class)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE terms (
+            term TEXT PRIMARY KEY,
+            start_date DATE NOT NULL,
+            end_date DATE NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE attendance_student_term (
+            term TEXT NOT NULL REFERENCES terms(term),
+            student_id TEXT NOT NULL,
+            days_present INTEGER NOT NULL,
+            PRIMARY KEY (term, student_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TRIGGER attendance_summary_insert AFTER INSERT ON attendance BEGIN
+            INSERT INTO attendance_class_daily (attendance_date, class, present, first_time_in)
+            VALUES (NEW.attendance_date,
+                    COALESCE((SELECT class FROM students WHERE student_id = NEW.student_id), ''),
+                    1, NEW.time_in)
+            ON CONFLICT (attendance_date, class) DO UPDATE
+                SET present = present + 1, first_time_in = MIN(first_time_in, excluded.first_time_in);
+            INSERT INTO attendance_student_term (term, student_id, days_present)
+            SELECT term, NEW.student_id, 1 FROM terms
+            WHERE NEW.attendance_date BETWEEN start_date AND end_date
+            ON CONFLICT (term, student_id) DO UPDATE SET days_present = days_present + 1;
+        END
+    """)
+    # Deletes run before the student row goes (see Database.delete_student) so the class is known
+    conn.execute("""
+        CREATE TRIGGER attendance_summary_delete AFTER DELETE ON attendance BEGIN
+            UPDATE attendance_class_daily
+            SET present = present - 1,
+                first_time_in = COALESCE((
+                    SELECT MIN(a.time_in) FROM attendance a JOIN students s ON s.student_id = a.student_id
+                    WHERE a.attendance_date = OLD.attendance_date
+                      AND COALESCE(s.class, '') = attendance_class_daily.class), first_time_in)
+            WHERE attendance_date = OLD.attendance_date
+              AND class = COALESCE((SELECT class FROM students WHERE student_id = OLD.student_id), '');
+            DELETE FROM attendance_class_daily WHERE attendance_date = OLD.attendance_date AND present <= 0;
+            UPDATE attendance_student_term SET days_present = days_present - 1
+            WHERE student_id = OLD.student_id
+              AND term IN (SELECT term FROM terms WHERE OLD.attendance_date BETWEEN start_date AND end_date);
+            DELETE FROM attendance_student_term WHERE student_id = OLD.student_id AND days_present <= 0;
+        END
+    """)
+    conn.execute("""
+        INSERT INTO attendance_class_daily (attendance_date, class, present, first_time_in)
+        SELECT a.attendance_date, COALESCE(s.class, ''), COUNT(*), MIN(a.time_in)
+        FROM attendance a LEFT JOIN students s ON s.student_id = a.student_id
+        GROUP BY a.attendance_date, COALESCE(s.class, '')
+    """)
+    conn.execute("CREATE INDEX idx_students_class ON students (class)")
+
+
+def attendance_class(conn):
+    # Each mark keeps the class its student was in when it was made, and the summary triggers
+    # key on it: before, a delete after a class change subtracted from the student's new class.
+    conn.execute("ALTER TABLE attendance ADD COLUMN class TEXT")
+    conn.execute("""
+        UPDATE attendance
+        SET class = COALESCE((SELECT class FROM students s WHERE s.student_id = attendance.student_id), '')
+    """)
+    conn.execute("DROP TRIGGER attendance_summary_insert")
+    conn.execute("DROP TRIGGER attendance_summary_delete")
+    conn.execute("""
+        CREATE TRIGGER attendance_summary_insert AFTER INSERT ON attendance BEGIN
+            UPDATE attendance
+            SET class = COALESCE((SELECT class FROM students WHERE student_id = NEW.student_id), '')
+            WHERE id = NEW.id AND class IS NULL;
+            INSERT INTO attendance_class_daily (attendance_date, class, present, first_time_in)
+            SELECT NEW.attendance_date, class, 1, NEW.time_in FROM attendance WHERE id = NEW.id
+            ON CONFLICT (attendance_date, class) DO UPDATE
+                SET present = present + 1, first_time_in = MIN(first_time_in, excluded.first_time_in);
+            INSERT INTO attendance_student_term (term, student_id, days_present)
+            SELECT term, NEW.student_id, 1 FROM terms
+            WHERE NEW.attendance_date BETWEEN start_date AND end_date
+            ON CONFLICT (term, student_id) DO UPDATE SET days_present = days_present + 1;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER attendance_summary_delete AFTER DELETE ON attendance BEGIN
+            UPDATE attendance_class_daily
+            SET present = present - 1,
+                first_time_in = COALESCE((
+                    SELECT MIN(time_in) FROM attendance
+                    WHERE attendance_date = OLD.attendance_date AND class = OLD.class), first_time_in)
+            WHERE attendance_date = OLD.attendance_date AND class = OLD.class;
+            DELETE FROM attendance_class_daily WHERE attendance_date = OLD.attendance_date AND present <= 0;
+            UPDATE attendance_student_term SET days_present = days_present - 1
+            WHERE student_id = OLD.student_id
+              AND term IN (SELECT term FROM terms WHERE OLD.attendance_date BETWEEN start_date AND end_date);
+            DELETE FROM attendance_student_term WHERE student_id = OLD.student_id AND days_present <= 0;
+        END
+    """)
+    conn.execute("CREATE INDEX idx_attendance_date_class ON attendance (attendance_date, class)")
+    _rebuild_class_daily(conn)
+
+
+def _rebuild_class_daily(conn):
+    conn.execute("DELETE FROM attendance_class_daily")
+    conn.execute("""
+        INSERT INTO attendance_class_daily (attendance_date, class, present, first_time_in)
+        SELECT attendance_date, class, COUNT(*), MIN(time_in) FROM attendance
+        GROUP BY attendance_date, class
+    """)
+
+
+def iso_attendance_dates(conn):
+    # The GUI used to store tkcalendar's locale dates (M/D/YY) while the service and ingest
+    # wrote ISO dates, so ranges and the daily unique constraint missed each other. Rewrite
+    # every date as ISO, keeping the earliest mark where both formats exist for one day.
+    from database import normalize_date  # database imports this module
+    conn.create_function("iso_date", 1, normalize_date, deterministic=True)
+    conn.execute("""
+        DELETE FROM attendance WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY student_id, iso_date(attendance_date) ORDER BY time_in, id) AS position
+                FROM attendance)
+            WHERE position > 1)
+    """)
+    conn.execute("UPDATE attendance SET attendance_date = iso_date(attendance_date) WHERE attendance_date != iso_date(attendance_date)")
+    conn.execute("UPDATE terms SET start_date = iso_date(start_date), end_date = iso_date(end_date)")
+    _rebuild_class_daily(conn)
+    conn.execute("DELETE FROM attendance_student_term")
+    conn.execute("""
+        INSERT INTO attendance_student_term (term, student_id, days_present)
+        SELECT t.term, a.student_id, COUNT(*) FROM terms t
+        JOIN attendance a ON a.attendance_date BETWEEN t.start_date AND t.end_date
+        GROUP BY t.term, a.student_id
+    """)
+
+
+# (version, description, function); append new migrations, never edit applied ones
+MIGRATIONS = [
+    (1, "create students and attendance tables", create_base_tables),
+    (2, "add stored face template columns", add_face_template_columns),
+    (3, "unique daily attendance and date indexes", unique_daily_attendance),
+    (4, "full-text search index on students", student_search_index),
+    (5, "students revision counter", students_revision),
+    (6, "attendance summary tables", attendance_summaries),
+    (7, "class at mark time on attendance rows", attendance_class),
+    (8, "ISO attendance dates", iso_attendance_dates),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, target=LATEST_VERSION):
+    """Apply pending migrations up to target and return the resulting schema version."""
+    version = get_version(conn)
+    for migration_version, description, apply in MIGRATIONS:
+        if migration_version <= version or migration_version > target:
+            continue
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            if get_version(conn) >= migration_version:
+                # Another process applied it while we waited for the write lock
+                conn.execute("COMMIT")
+                continue
+            apply(conn)
+            conn.execute(f"PRAGMA user_version={migration_version}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        version = migration_version
+    return version
@@ -0,0 +1,103 @@
+import logging
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class PagedTreeview:
+    """Feeds a ttk.Treeview from a paginated query, one page at a time as the user scrolls.
+
+    fetch_page(after, limit) runs on a worker thread and returns (rows, next_after), where
+    next_after is the keyset cursor for the following page or None once the query is
+    exhausted. row_values(row) turns a row into the tuple shown in the tree. Only the pages
+    the user has scrolled to are ever fetched or inserted, and the UI thread never waits
+    on the database. Pages are fetched by one worker thread owned by the view, which ends
+    (closing its database connection) when the tree is destroyed.
+    """
+
+    def __init__(self, tree, scrollbar, row_values=tuple, page_size=Config.PAGE_SIZE,
+                 prefetch_fraction=0.8, poll_ms=30):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.row_values = row_values
+        self.page_size = page_size
+        self.prefetch_fraction = prefetch_fraction  # Load the next page once this far down
+        self.poll_ms = poll_ms
+        self.fetch_page = None
+        self.row_count = 0
+        self._after = None
+        self._exhausted = True
+        self._loading = False
+        self._generation = 0  # Bumped on reset so late pages from an old query are dropped
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="page-fetch")
+        self.tree.configure(yscrollcommand=self._on_scroll)
+        self.scrollbar.configure(command=self.tree.yview)
+        self.tree.bind("<Destroy>", self._on_destroy, add="+")
+
+    def _on_destroy(self, event):
+        self._generation += 1
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def reset(self, fetch_page):
+        """Clear the tree and start showing the results of a new query."""
+        self._generation += 1
+        self.fetch_page = fetch_page
+        self.tree.delete(*self.tree.get_children())
+        self.row_count = 0
+        self._after = None
+        self._exhausted = False
+        self._loading = False
+        self._load_next_page()
+
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if float(last) >= self.prefetch_fraction:
+            self._load_next_page()
+
+    def _load_next_page(self):
+        if self._loading or self._exhausted or self.fetch_page is None:
+            return
+        self._loading = True
+        generation, fetch_page, after = self._generation, self.fetch_page, self._after
+
+        def fetch():
+            if generation != self._generation:
+                return None  # Superseded while queued (e.g. typing in a search box)
+            return fetch_page(after, self.page_size)
+
+        future = self._executor.submit(fetch)
+        self.tree.after(self.poll_ms, self._poll, generation, future)
+
+    def _poll(self, generation, future):
+        # Stop when the screen was closed or a reset started a newer query
+        if generation != self._generation or not self.tree.winfo_exists():
+            return
+        if not future.done():
+            self.tree.after(self.poll_ms, self._poll, generation, future)
+            return
+
+        self._loading = False
+        error = future.exception()
+        if error is not None:
+            self._exhausted = True
+            logger.error("Error loading rows: %s", error)
+            return
+
+        rows, self._after = future.result()
+        self._exhausted = self._after is None
+        for row in rows:
+            self.tree.insert("", tk.END, values=self.row_values(row))
+        self.row_count += len(rows)
+
+        # Keep filling until the view is scrollable, so short first pages still lead somewhere
+        if not self._exhausted and float(self.tree.yview()[1]) >= self.prefetch_fraction:
+            self._load_next_page()
+
+
+def keyset_page(rows, limit, key):
+    """Build a fetch_page result: a full page continues after key(last row), a short one ends."""
+    if len(rows) < limit:
+        return rows, None
+    return rows, key(rows[-1])
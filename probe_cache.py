@@ -0,0 +1,82 @@
+import collections
+import threading
+import time
+import cv2
+import numpy as np
+from config import Config
+from template_index import hamming_distances
+
+# Short-lived cache of match results in front of the face index. A face standing in front
+# of a camera produces dozens of near-identical crops; they share a coarse key (a 4x4
+# average hash of the crop plus its position on a grid), and a cached result is reused when
+# the full probe hash is also within a few bits of the one it was computed for.
+
+
+def coarse_key(face_bgr, box):
+    """Coarse perceptual key of a face crop: a 16-bit average hash plus its grid cell and size."""
+    gray = cv2.cvtColor(face_bgr, cv2.COLOR_BGR2GRAY) if face_bgr.ndim == 3 else face_bgr
+    tiny = cv2.resize(gray, (4, 4), interpolation=cv2.INTER_AREA)
+    bits = int(np.packbits(tiny.flatten() > tiny.mean()).view('>u2')[0])
+    x, y, w, h = box
+    grid = Config.PROBE_CACHE_GRID
+    return bits, (x + w // 2) // grid, (y + h // 2) // grid, w // grid
+
+
+class ProbeCache:
+    """Thread-safe LRU cache with a TTL, mapping probe keys to match results.
+
+    clock times the TTL; the replay harness passes its simulated one.
+    """
+
+    def __init__(self, max_entries=Config.PROBE_CACHE_SIZE, ttl=Config.PROBE_CACHE_TTL,
+                 max_distance=Config.PROBE_CACHE_MAX_DISTANCE, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl  # Seconds a result stays valid
+        self.clock = clock
+        self.max_distance = max_distance  # Max Hamming distance between the cached and new probe hash
+        self._entries = collections.OrderedDict()  # key -> (expires, probe hash, result)
+        self._owner = None  # The index the cached results were computed against
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, probe, owner):
+        """Cached result for key if it is fresh, from the same index and probe is close enough."""
+        now = self.clock()
+        with self._lock:
+            if owner is not self._owner:
+                self._entries.clear()  # Students changed, every cached decision may be wrong
+                self._owner = owner
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] >= now and hamming_distances(probe, entry[1][None, :])[0] <= self.max_distance:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+            return None
+
+    def put(self, key, probe, result, owner):
+        with self._lock:
+            if owner is not self._owner:
+                return
+            self._entries[key] = (self.clock() + self.ttl, np.array(probe, dtype=np.uint8), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'evictions': self.evictions,
+            }
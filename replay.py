@@ -0,0 +1,301 @@
+import argparse
+import csv
+import json
+import os
+import pathlib
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+import cv2
+import numpy as np
+from auto_attendance import ContinuousRecognizer
+from camera import ImageFolderCapture
+from config import Config
+from database import Database
+from face_index import FaceIndex, face_hashes
+
+# End-to-end replay of a recorded door session: every frame of a video or image folder goes
+# through capture -> detect -> recognize -> mark exactly as in auto mode, against a throwaway
+# copy of the database. Time is simulated: frames arrive at their recorded timestamps and a
+# frame is processed only if the recognizer has finished the previous one, so the report
+# shows what this machine would achieve live, without waiting in real time.
+#
+#   python replay.py session.mp4 --labels session.csv --output replay.json
+#
+# The labels CSV (columns start,end,student_id; frame numbers from 1, end inclusive) says
+# who is in front of the camera; "unknown" or an ID that is not enrolled marks an impostor.
+# With labels the report adds time-to-mark per person and a false-accept/false-reject sweep
+# over the Hamming match threshold.
+
+STAGES = ("capture", "detect", "match", "mark", "frame")
+
+
+class SimulatedClock:
+    """Monotonic clock that only moves when the replay advances it."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def read_labels(path):
+    """(start, end, student_id) ranges from a labels CSV; student_id None for impostors."""
+    labels = []
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            student_id = (row.get('student_id') or "").strip()
+            if student_id.lower() in ("", "unknown"):
+                student_id = None
+            labels.append((int(row['start']), int(row['end']), student_id))
+    return labels
+
+
+def label_for(labels, seq):
+    for start, end, student_id in labels:
+        if start <= seq <= end:
+            return True, student_id
+    return False, None
+
+
+def copy_database(db_path, workdir):
+    """Consistent copy of db_path (including WAL contents) in workdir."""
+    if not os.path.isfile(db_path):
+        raise SystemExit(f"Database {db_path} not found")
+    copy_path = os.path.join(workdir, os.path.basename(db_path))
+    source = sqlite3.connect(f"{pathlib.Path(db_path).resolve().as_uri()}?mode=ro", uri=True)
+    target = sqlite3.connect(copy_path)
+    with target:
+        source.backup(target)
+    target.close()
+    source.close()
+    return copy_path
+
+
+def open_source(source, fps):
+    """(capture, frame rate) for a video file or image folder."""
+    if os.path.isdir(source):
+        return ImageFolderCapture(source, loop=False), fps or Config.CAMERA_FPS
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise SystemExit(f"Cannot open {source}")
+    return capture, fps or capture.get(cv2.CAP_PROP_FPS) or Config.CAMERA_FPS
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = np.asarray(values) * 1000
+    return {
+        'count': len(values),
+        'p50_ms': float(np.percentile(values, 50)),
+        'p95_ms': float(np.percentile(values, 95)),
+        'p99_ms': float(np.percentile(values, 99)),
+        'max_ms': float(values.max()),
+    }
+
+
+def threshold_sweep(face_index, probes, max_threshold):
+    """False accept/reject rates of the nearest-match decision at every threshold up to max_threshold.
+
+    probes are (template, student_id) pairs, student_id None for impostors. A genuine probe
+    is falsely rejected unless its nearest enrolled face is the right student within the
+    threshold; any probe accepted as somebody else is a false accept.
+    """
+    if not probes:
+        return []
+    nearest = face_index.search(np.array([template for template, _ in probes]), k=1)
+    enrolled = {student[2] for student in face_index.students}
+    attempts = []
+    for (_, student_id), matches in zip(probes, nearest):
+        student, distance = matches[0] if matches else (None, None)
+        genuine = student_id in enrolled
+        attempts.append((genuine, distance, student is not None and student[2] == student_id))
+
+    genuine_count = sum(1 for genuine, _, _ in attempts if genuine)
+    impostor_count = len(attempts) - genuine_count
+    sweep = []
+    for threshold in range(max_threshold + 1):
+        false_accepts = false_rejects = misidentified = 0
+        for genuine, distance, correct in attempts:
+            accepted = distance is not None and distance <= threshold
+            if genuine and not (accepted and correct):
+                false_rejects += 1
+            if accepted and not correct:
+                false_accepts += 1
+                misidentified += genuine
+        sweep.append({
+            'threshold': threshold,
+            'far': false_accepts / len(attempts),
+            'frr': false_rejects / genuine_count if genuine_count else None,
+            'impostors_accepted': (false_accepts - misidentified) / impostor_count if impostor_count else None,
+            'misidentified': misidentified / genuine_count if genuine_count else None,
+        })
+    return sweep
+
+
+def replay(args):
+    workdir = tempfile.mkdtemp(prefix="attendance_replay_")
+    try:
+        db = Database(copy_database(args.db, workdir))
+        face_index = FaceIndex(db, threshold=args.threshold)
+        face_index.refresh()
+        report = run_session(args, db, face_index)
+        db.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def run_session(args, db, face_index):
+    labels = read_labels(args.labels) if args.labels else []
+    capture, fps = open_source(args.source, args.fps)
+    clock = SimulatedClock()
+    recognizer = ContinuousRecognizer(None, face_index, every_n_frames=args.every_n_frames, clock=clock)
+    if face_index.cache is not None:
+        face_index.cache.clock = clock  # Cached results expire on the recorded timeline
+    session_start = datetime.combine(datetime.strptime(args.date, "%Y-%m-%d").date(), datetime.min.time())
+    session_start += timedelta(hours=8)
+
+    latencies = {stage: [] for stage in STAGES}
+    detected = []
+
+    # Time the stages inside the recognizer's own calls
+    detect = recognizer.face_detector.detect
+    best_matches = face_index.best_matches
+
+    def timed_detect(frame, use_roi=False):
+        start = time.perf_counter()
+        boxes = detect(frame, use_roi=use_roi)
+        latencies['detect'].append(time.perf_counter() - start)
+        detected.append(boxes)
+        return boxes
+
+    def timed_best_matches(faces_bgr, refresh=True, boxes=None):
+        start = time.perf_counter()
+        matches = best_matches(faces_bgr, refresh=refresh, boxes=boxes)
+        latencies['match'].append(time.perf_counter() - start)
+        return matches
+
+    recognizer.face_detector.detect = timed_detect
+    face_index.best_matches = timed_best_matches
+
+    seq = 0
+    busy_until = 0.0
+    processed = dropped = 0
+    busy_time = 0.0
+    first_seen = {}  # Labelled student_id -> simulated time first in view
+    marked = {}  # student_id -> simulated time of the mark
+    probes = []  # (template, labelled student_id) per face in labelled single-face frames
+    while args.max_frames is None or seq < args.max_frames:
+        start = time.perf_counter()
+        ret, frame = capture.read()
+        capture_time = time.perf_counter() - start
+        if not ret:
+            break
+        latencies['capture'].append(capture_time)
+        seq += 1
+        arrival = (seq - 1) / fps
+        labelled, label = label_for(labels, seq)
+        if label is not None:
+            first_seen.setdefault(label, arrival)
+        if seq % recognizer.every_n_frames:
+            continue
+        if arrival < busy_until:
+            dropped += 1  # Live, the grabber would have replaced this frame while we were busy
+            continue
+
+        clock.now = arrival
+        detected.clear()
+        start = time.perf_counter()
+        recognizer.process_frame(frame)
+        moment = session_start + timedelta(seconds=arrival)
+        marked_now = []
+        while not recognizer.results.empty():
+            student, distance = recognizer.results.get_nowait()
+            mark_start = time.perf_counter()
+            db.mark_attendance(student[2], args.date, moment.strftime("%H:%M:%S"))
+            latencies['mark'].append(time.perf_counter() - mark_start)
+            marked_now.append(student[2])
+        elapsed = time.perf_counter() - start
+        latencies['frame'].append(elapsed)
+        busy_time += elapsed
+        busy_until = arrival + elapsed
+        processed += 1
+        for marked_id in marked_now:
+            marked.setdefault(marked_id, busy_until)  # Marked once the frame is done
+        if labelled and detected and len(detected[0]) == 1:
+            x, y, w, h = detected[0][0]
+            probes.append((face_hashes([frame[y:y + h, x:x + w]])[0], label))
+    capture.release()
+    db.flush_attendance()
+
+    duration = seq / fps if seq else 0.0
+    people = {}
+    for student_id, seen in sorted(first_seen.items()):
+        mark_time = marked.get(student_id)
+        people[student_id] = {
+            'first_seen_s': seen,
+            'marked': mark_time is not None,
+            'time_to_mark_s': mark_time - seen if mark_time is not None else None,
+        }
+    wrong_marks = sorted(student for student in marked if labels and student not in first_seen)
+    return {
+        'source': args.source,
+        'frames': seq,
+        'recorded_fps': fps,
+        'duration_s': duration,
+        'processed_frames': processed,
+        'dropped_frames': dropped,
+        'processing_fps': processed / busy_time if busy_time else None,
+        'effective_fps': processed / duration if duration else None,
+        'latency': {stage: percentiles(values) for stage, values in latencies.items()},
+        'marked': sorted(marked),
+        'people': people,
+        'wrong_marks': wrong_marks,
+        'threshold_sweep': threshold_sweep(face_index, probes, args.max_threshold) if labels else [],
+    }
+
+
+def print_report(report):
+    print(f"{report['source']}: {report['frames']} frames ({report['duration_s']:.1f}s at {report['recorded_fps']:.1f} fps)")
+    print(f"Processed {report['processed_frames']}, dropped {report['dropped_frames']}; "
+          f"{report['processing_fps'] or 0:.1f} fps of processing, {report['effective_fps'] or 0:.1f} fps effective")
+    for stage, stats in report['latency'].items():
+        if stats:
+            print(f"  {stage:8s} p50 {stats['p50_ms']:8.2f} ms  p95 {stats['p95_ms']:8.2f} ms  p99 {stats['p99_ms']:8.2f} ms")
+    print(f"Marked: {', '.join(report['marked']) or 'nobody'}")
+    for student_id, person in report['people'].items():
+        result = f"{person['time_to_mark_s']:.2f}s to mark" if person['marked'] else "never marked"
+        print(f"  {student_id}: in view at {person['first_seen_s']:.2f}s, {result}")
+    if report['wrong_marks']:
+        print(f"Marked but not in the labels: {', '.join(report['wrong_marks'])}")
+    if report['threshold_sweep']:
+        print("threshold    FAR      FRR")
+        for row in report['threshold_sweep']:
+            frr = f"{row['frr']:.3f}" if row['frr'] is not None else "  -  "
+            print(f"{row['threshold']:9d}  {row['far']:.3f}  {frr}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay a recorded session through detection, recognition and marking")
+    parser.add_argument("source", help="Video file or image folder")
+    parser.add_argument("--db", default="attendance_system.db", help="Database to copy for the replay (left untouched)")
+    parser.add_argument("--labels", help="CSV of start,end,student_id frame ranges for accuracy figures")
+    parser.add_argument("--fps", type=float, default=None, help="Frame rate of the recording (default: from the video, or CAMERA_FPS)")
+    parser.add_argument("--every-n-frames", type=int, default=Config.AUTO_EVERY_N_FRAMES)
+    parser.add_argument("--threshold", type=int, default=Config.FACE_MATCH_THRESHOLD, help="Match threshold for the replay")
+    parser.add_argument("--max-threshold", type=int, default=20, help="Largest threshold in the FAR/FRR sweep")
+    parser.add_argument("--date", default=datetime.now().strftime("%Y-%m-%d"), help="Session date for the marks")
+    parser.add_argument("--max-frames", type=int, default=None)
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    report = replay(args)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
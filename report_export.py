@@ -0,0 +1,96 @@
+import argparse
+import csv
+import importlib.util
+import os
+from config import Config
+
+# Streaming attendance report export. Rows come straight from the database in fetchmany()
+# batches and are written out as they arrive, so an export of any size uses the memory of
+# one batch and does not need the GUI.
+
+REPORT_HEADER = ["Student Name", "Student ID", "Date", "Time In"]
+REPORT_COLUMNS = ["name", "student_id", "attendance_date", "time_in"]
+EXPORT_FORMATS = ("csv", "parquet")
+
+
+def parquet_available():
+    # Only look pyarrow up; importing it takes long enough to stall the GUI's save dialog
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def export_csv(db, path, start_date, end_date, batch_size=Config.EXPORT_BATCH_SIZE):
+    """Write the report for [start_date, end_date] to a CSV file and return the row count."""
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(REPORT_HEADER)
+        for rows in db.iter_attendance_report(start_date, end_date, batch_size):
+            writer.writerows(rows)
+            count += len(rows)
+    return count
+
+
+def export_parquet(db, path, start_date, end_date, batch_size=Config.EXPORT_BATCH_SIZE):
+    """Write the report to a Parquet file, one row group per batch, and return the row count.
+
+    Needs pyarrow, which is optional: install it to enable Parquet export.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+
+    schema = pa.schema([(column, pa.string()) for column in REPORT_COLUMNS])
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for rows in db.iter_attendance_report(start_date, end_date, batch_size):
+            columns = [[str(value) for value in column] for column in zip(*rows)]
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+            count += len(rows)
+    return count
+
+
+def export_report(db, path, start_date, end_date, fmt=None, batch_size=Config.EXPORT_BATCH_SIZE):
+    """Export a report, choosing the format from fmt or the file extension (default CSV).
+
+    The file is written under a temporary name and renamed into place, so a failed export
+    never leaves a truncated report behind.
+    """
+    if fmt is None:
+        fmt = "parquet" if os.path.splitext(path)[1].lower() in (".parquet", ".pq") else "csv"
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    exporter = export_parquet if fmt == "parquet" else export_csv
+    tmp_path = path + ".tmp"
+    try:
+        count = exporter(db, tmp_path, start_date, end_date, batch_size)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return count
+
+
+if __name__ == '__main__':
+    from database import Database
+
+    parser = argparse.ArgumentParser(description="Export an attendance report without the GUI")
+    parser.add_argument("start_date", help="First day of the report (YYYY-MM-DD)")
+    parser.add_argument("end_date", help="Last day of the report (YYYY-MM-DD)")
+    parser.add_argument("output", help="Output file; a .parquet extension selects Parquet")
+    parser.add_argument("--db", default="attendance_system.db", help="Path to the SQLite database")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default=None, help="Override the output format")
+    parser.add_argument("--batch-size", type=int, default=Config.EXPORT_BATCH_SIZE,
+                        help="Rows fetched from the database per batch")
+    args = parser.parse_args()
+
+    db = Database(args.db, write_behind=False)
+    try:
+        count = export_report(db, args.output, args.start_date, args.end_date, args.format, args.batch_size)
+        print(f"Exported {count} rows to {args.output}")
+    except (RuntimeError, ValueError) as e:
+        parser.exit(1, f"Export failed: {e}\n")
+    finally:
+        db.close()
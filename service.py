@@ -0,0 +1,239 @@
+import argparse
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import date, datetime
+import cv2
+import numpy as np
+from flask import Flask, jsonify, request
+from config import Config
+from database import get_database, normalize_date
+from face_utils import FaceRecognizer
+from metrics import metrics
+
+# Headless recognition service. One FaceRecognizer keeps the face index in memory and a
+# MatchBatcher thread gathers the images of concurrent requests into a single recognize()
+# call, so several door cameras posting at once share one vectorized match pass.
+
+_STOP = object()
+
+
+class MatchBatcher(threading.Thread):
+    """Micro-batches recognition requests onto a single FaceRecognizer.
+
+    submit() queues a list of BGR frames and returns a Future for their results. The
+    thread waits up to max_wait seconds after the first queued request for others to
+    arrive, then recognizes up to max_batch frames in one call. The recognizer (and its
+    non-thread-safe detector) is only ever used from this thread.
+    """
+
+    def __init__(self, recognizer, max_batch=Config.SERVICE_MAX_BATCH, max_wait=Config.SERVICE_MAX_WAIT):
+        super().__init__(daemon=True)
+        self.recognizer = recognizer
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._reload = threading.Event()
+
+    def submit(self, frames, k=1, detect=True):
+        future = Future()
+        self._queue.put((frames, k, detect, future))
+        return future
+
+    def reload(self):
+        # Students may have been enrolled by another process; re-read them before the next batch
+        self._reload.set()
+
+    def stop(self):
+        self._queue.put(_STOP)
+        self.join()
+
+    def run(self):
+        carry = None  # A request taken off the queue that belongs in the next batch
+        while True:
+            item = carry if carry is not None else self._queue.get()
+            carry = None
+            if item is _STOP:
+                break
+
+            batch = [item]
+            frame_count = len(item[0])
+            deadline = time.monotonic() + self.max_wait
+            while frame_count < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _STOP or item[1:3] != batch[0][1:3]:
+                    carry = item  # Stopping, or different k/detect options
+                    break
+                batch.append(item)
+                frame_count += len(item[0])
+            self._recognize(batch)
+
+    def _recognize(self, batch):
+        if self._reload.is_set():
+            self._reload.clear()
+            self.recognizer.face_index.invalidate()
+        frames = [frame for frames, _, _, _ in batch for frame in frames]
+        k, detect = batch[0][1:3]
+        try:
+            results = self.recognizer.recognize(frames, k=k, detect=detect)
+        except Exception as e:
+            for _, _, _, future in batch:
+                future.set_exception(e)
+            return
+        start = 0
+        for frames, _, _, future in batch:
+            future.set_result(results[start:start + len(frames)])
+            start += len(frames)
+
+
+def decode_images():
+    """BGR frames from the request: multipart 'image' files, or a raw JPEG body."""
+    blobs = [file.read() for file in request.files.getlist("image")]
+    if not blobs and request.data:
+        blobs = [request.data]
+    frames = []
+    for blob in blobs:
+        frame = cv2.imdecode(np.frombuffer(blob, np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            raise ValueError("Could not decode image")
+        frames.append(frame)
+    return frames
+
+
+def face_json(face):
+    return {
+        'face_location': [int(v) for v in face['face_location']],
+        'student_id': face['student_id'],
+        'name': face['name'],
+        'distance': None if face['distance'] is None else int(face['distance']),
+        'matches': [{'student_id': sid, 'name': name, 'distance': int(distance)}
+                    for sid, name, distance in face['matches']],
+    }
+
+
+def create_app(db=None, recognizer=None, batcher=None):
+    db = db or get_database()
+    recognizer = recognizer or FaceRecognizer(db)
+    if batcher is None:
+        batcher = MatchBatcher(recognizer)
+        batcher.start()
+
+    app = Flask(__name__)
+    app.config['BATCHER'] = batcher
+
+    def recognize_request():
+        frames = decode_images()
+        if not frames:
+            raise ValueError("No image in request")
+        k = request.args.get("k", 1, type=int)
+        detect = request.args.get("detect", "1") != "0"
+        with metrics.timer("request"):
+            return batcher.submit(frames, k=k, detect=detect).result()
+
+    @app.errorhandler(ValueError)
+    def bad_request(e):
+        return jsonify(error=str(e)), 400
+
+    @app.get("/health")
+    def health():
+        cache = recognizer.face_index.cache
+        return jsonify(status="ok", students=len(recognizer.face_index.students),
+                       probe_cache=cache.stats() if cache is not None else None)
+
+    @app.get("/metrics")
+    def metrics_snapshot():
+        return jsonify(metrics.snapshot())
+
+    @app.post("/recognize")
+    def recognize():
+        results = recognize_request()
+        return jsonify(results=[[face_json(face) for face in faces] for faces in results])
+
+    @app.post("/attendance")
+    def attendance():
+        # Either mark a known student ID directly, or every recognized face in the images
+        today = normalize_date(date.today())
+        current_time = datetime.now().strftime("%H:%M:%S")
+        payload = request.get_json(silent=True) if request.is_json else None
+        if payload and payload.get("student_id"):
+            student_ids = [payload["student_id"]]
+            if db.get_student(student_ids[0]) is None:
+                return jsonify(error="Unknown student ID"), 404
+        else:
+            student_ids = sorted({face['student_id'] for faces in recognize_request()
+                                  for face in faces if face['student_id'] != "Unknown"})
+        # Only students not already marked today are reported as marked
+        marked = [student_id for student_id in student_ids if db.mark_attendance(student_id, today, current_time)]
+        return jsonify(date=today, time_in=current_time, marked=marked)
+
+    @app.post("/reload")
+    def reload():
+        batcher.reload()
+        return jsonify(status="ok")
+
+    return app
+
+
+def run_benchmark(app, image_path, clients, requests_per_client):
+    """Post image_path to /recognize from concurrent test clients and print throughput."""
+    with open(image_path, 'rb') as f:
+        blob = f.read()
+    latencies = []
+    lock = threading.Lock()
+
+    def client():
+        test_client = app.test_client()
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            response = test_client.post("/recognize", data=blob, content_type="image/jpeg")
+            elapsed = time.perf_counter() - start
+            if response.status_code != 200:
+                print(f"Request failed: {response.status_code} {response.get_data(as_text=True)}")
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    total = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"{len(latencies)} requests from {clients} clients in {total:.2f}s "
+          f"({len(latencies) / total:.1f} req/s)")
+    print(f"latency p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Headless face recognition service")
+    parser.add_argument("--db", default="attendance_system.db", help="Path to the SQLite database")
+    subparsers = parser.add_subparsers(dest="command")
+    serve_parser = subparsers.add_parser("serve", help="Run the HTTP service (default)")
+    serve_parser.add_argument("--host", default=Config.SERVICE_HOST)
+    serve_parser.add_argument("--port", type=int, default=Config.SERVICE_PORT)
+    bench_parser = subparsers.add_parser("bench", help="Load-test /recognize with the Flask test client")
+    bench_parser.add_argument("image", help="JPEG to post")
+    bench_parser.add_argument("--clients", type=int, default=8, help="Concurrent clients")
+    bench_parser.add_argument("--requests", type=int, default=50, help="Requests per client")
+    args = parser.parse_args()
+    logging.basicConfig(level=Config.LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    db = get_database(args.db)
+    app = create_app(db)
+    try:
+        if args.command == "bench":
+            run_benchmark(app, args.image, args.clients, args.requests)
+        else:
+            app.run(host=getattr(args, "host", Config.SERVICE_HOST),
+                    port=getattr(args, "port", Config.SERVICE_PORT), threaded=True)
+    finally:
+        app.config['BATCHER'].stop()
+        db.close()
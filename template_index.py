@@ -0,0 +1,471 @@
+import atexit
+import itertools
+import multiprocessing
+import os
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from config import Config
+
+HASH_BYTES = 8  # 8x8 average hash packed into 64 bits
+
+# Number of set bits for every possible byte value, used for vectorized Hamming distances
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def hamming_distances(probe, templates):
+    # probe: (HASH_BYTES,), templates: (N, HASH_BYTES) -> (N,) distances
+    return _POPCOUNT[np.bitwise_xor(templates, probe)].sum(axis=1, dtype=np.int32)
+
+
+def top_k_hamming(probes, templates, k=1, max_elements=Config.MATCH_CHUNK_ELEMENTS):
+    """Return (indices, distances), both (M, k), of the k closest templates for each probe.
+
+    Probes are processed in chunks so the (probes x templates) work matrix never exceeds
+    max_elements cells, keeping memory bounded for large enrollments.
+    """
+    probes = np.asarray(probes, dtype=np.uint8).reshape(-1, HASH_BYTES)
+    count = len(templates)
+    k = min(k, count)
+    indices = np.empty((len(probes), k), dtype=np.int64)
+    distances = np.empty((len(probes), k), dtype=np.int32)
+    if k == 0:
+        return indices, distances
+
+    step = max(1, max_elements // max(1, count * HASH_BYTES))
+    for start in range(0, len(probes), step):
+        chunk = probes[start:start + step]
+        chunk_distances = _POPCOUNT[np.bitwise_xor(chunk[:, None, :], templates[None, :, :])].sum(axis=2, dtype=np.int32)
+        if k < count:
+            candidates = np.argpartition(chunk_distances, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.broadcast_to(np.arange(count), chunk_distances.shape)
+        candidate_distances = np.take_along_axis(chunk_distances, candidates, axis=1)
+        order = np.argsort(candidate_distances, axis=1, kind="stable")
+        indices[start:start + step] = np.take_along_axis(candidates, order, axis=1)
+        distances[start:start + step] = np.take_along_axis(candidate_distances, order, axis=1)
+    return indices, distances
+
+
+class TemplateIndex:
+    """Keyed store of face hashes with incremental add/remove and .npz persistence.
+
+    Removed rows become tombstones until compact(); subclasses add the search structure.
+    """
+
+    kind = None
+
+    def __init__(self):
+        self._templates = np.empty((0, HASH_BYTES), dtype=np.uint8)
+        self._alive = np.empty(0, dtype=bool)
+        self._keys = []
+        self._rows = {}  # key -> row
+        self._size = 0
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, key):
+        return key in self._rows
+
+    def keys(self):
+        return list(self._rows)
+
+    def get(self, key):
+        row = self._rows.get(key)
+        return None if row is None else self._templates[row]
+
+    def add(self, key, template):
+        """Insert or replace the template stored under key."""
+        if key in self._rows:
+            self.remove(key)
+        if self._size == len(self._templates):
+            capacity = max(64, self._size * 2)
+            self._templates = np.resize(self._templates, (capacity, HASH_BYTES))
+            self._alive = np.resize(self._alive, capacity)
+            self._alive[self._size:] = False
+        row = self._size
+        self._templates[row] = np.frombuffer(bytes(template), dtype=np.uint8)
+        self._alive[row] = True
+        self._keys.append(key)
+        self._rows[key] = row
+        self._size += 1
+        self._on_add(row)
+
+    def add_many(self, keys, templates):
+        """Bulk insert; the search structure is updated once instead of per row."""
+        keys = list(keys)
+        templates = np.asarray(templates, dtype=np.uint8).reshape(-1, HASH_BYTES)
+        for key in keys:
+            if key in self._rows:
+                self.remove(key)
+        start = self._size
+        self._templates = np.concatenate([self._templates[:start], templates])
+        self._alive = np.concatenate([self._alive[:start], np.ones(len(keys), dtype=bool)])
+        for offset, key in enumerate(keys):
+            self._keys.append(key)
+            self._rows[key] = start + offset
+        self._size += len(keys)
+        if keys:
+            self._on_add(self._size - 1)
+
+    def attach(self, keys, templates, alive):
+        """Use templates as the contents without copying them, e.g. a read-only np.memmap view.
+
+        keys[i] is the key of templates[i], or None where alive[i] is False. Adding to an
+        attached index copies the templates into memory first, the mapping is never written.
+        """
+        self._templates = templates
+        self._alive = np.asarray(alive, dtype=bool)
+        self._keys = list(keys)
+        self._rows = {key: row for row, key in enumerate(self._keys) if key is not None}
+        self._size = len(self._keys)
+        self._rebuild()
+
+    def remove(self, key):
+        row = self._rows.pop(key, None)
+        if row is None:
+            return False
+        self._alive[row] = False
+        self._keys[row] = None
+        self._on_remove(row)
+        return True
+
+    def compact(self):
+        """Drop tombstoned rows and rebuild the search structure."""
+        alive = np.flatnonzero(self._alive[:self._size])
+        self._templates = self._templates[alive].copy()
+        self._alive = np.ones(len(alive), dtype=bool)
+        self._keys = [self._keys[row] for row in alive]
+        self._rows = {key: row for row, key in enumerate(self._keys)}
+        self._size = len(alive)
+        self._rebuild()
+
+    def copy(self):
+        clone = self.__class__.__new__(self.__class__)
+        clone.__dict__.update(self.__dict__)
+        clone._templates = self._templates.copy()
+        clone._alive = self._alive.copy()
+        clone._keys = list(self._keys)
+        clone._rows = dict(self._rows)
+        clone._copy_structure()
+        return clone
+
+    def search(self, probes, k=1, max_distance=None):
+        """Return, per probe hash, up to k (key, distance) pairs nearest first.
+
+        With max_distance only templates within that Hamming distance are returned.
+        """
+        raise NotImplementedError
+
+    def save(self, path):
+        arrays = {
+            "kind": np.array(self.kind),
+            "templates": self._templates[:self._size],
+            "alive": self._alive[:self._size],
+            "keys": np.array(["" if key is None else str(key) for key in self._keys], dtype=str),
+        }
+        arrays.update(self._structure_arrays())
+        # Write beside the target and swap in, so readers never see a half-written index
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files}
+        index_class = INDEX_TYPES[str(arrays["kind"])]
+        index = index_class.__new__(index_class)
+        TemplateIndex.__init__(index)
+        index._templates = arrays["templates"].copy()
+        index._alive = arrays["alive"].copy()
+        index._size = len(index._templates)
+        index._keys = [str(key) if alive else None for key, alive in zip(arrays["keys"], index._alive)]
+        index._rows = {key: row for row, key in enumerate(index._keys) if key is not None}
+        index._load_structure(arrays)
+        return index
+
+    def _alive_rows(self):
+        return np.flatnonzero(self._alive[:self._size])
+
+    def _results(self, rows, distances, k, max_distance):
+        if max_distance is not None:
+            keep = distances <= max_distance
+            rows, distances = rows[keep], distances[keep]
+        order = np.argsort(distances, kind="stable")[:k]
+        return [(self._keys[rows[i]], int(distances[i])) for i in order]
+
+    # Hooks for subclasses
+    def _on_add(self, row):
+        pass
+
+    def _on_remove(self, row):
+        pass
+
+    def _rebuild(self):
+        pass
+
+    def _copy_structure(self):
+        pass
+
+    def _structure_arrays(self):
+        return {}
+
+    def _load_structure(self, arrays):
+        pass
+
+
+class BruteForceIndex(TemplateIndex):
+    """Exact O(N) search: one vectorized Hamming pass over every live template."""
+
+    kind = "brute"
+
+    def search(self, probes, k=1, max_distance=None):
+        probes = np.asarray(probes, dtype=np.uint8).reshape(-1, HASH_BYTES)
+        rows = self._alive_rows()
+        indices, distances = top_k_hamming(probes, self._templates[rows], k)
+        results = []
+        for row_indices, row_distances in zip(indices, distances):
+            results.append(self._results(rows[row_indices], row_distances, k, max_distance))
+        return results
+
+
+class MultiIndexHashIndex(TemplateIndex):
+    """Multi-index hashing (Norouzi et al.) for sublinear Hamming search.
+
+    Each 64-bit hash is split into `chunks` substrings. By the pigeonhole principle any
+    template within distance r of a probe matches it within r // chunks bits on at least
+    one substring, so only table entries near the probe's substrings are verified. Each
+    substring table is a sorted array (searchsorted lookups, cheap to persist); inserts go
+    to a small unsorted tail that is merged once it grows past reindex_fraction of the index.
+    """
+
+    kind = "mih"
+    _CHUNK_DTYPES = {2: ">u4", 4: ">u2", 8: "u1"}
+
+    def __init__(self, chunks=Config.FACE_INDEX_MIH_CHUNKS, reindex_fraction=0.05, max_chunk_radius=4):
+        super().__init__()
+        if chunks not in self._CHUNK_DTYPES:
+            raise ValueError(f"chunks must be one of {sorted(self._CHUNK_DTYPES)}")
+        self.chunks = chunks
+        self.chunk_bits = HASH_BYTES * 8 // chunks
+        self.reindex_fraction = reindex_fraction
+        self.max_chunk_radius = max_chunk_radius  # Beyond this a probe falls back to brute force
+        self._indexed = 0  # Rows [0, _indexed) are covered by the sorted tables
+        self._sorted_values = np.empty((chunks, 0), dtype=np.uint32)
+        self._sorted_rows = np.empty((chunks, 0), dtype=np.int64)
+        self._masks = {}
+
+    def _chunk_values(self, templates):
+        return np.ascontiguousarray(templates).view(self._CHUNK_DTYPES[self.chunks]).astype(np.uint32)
+
+    def _flip_masks(self, radius):
+        # Every chunk-sized value with at most `radius` bits set
+        masks = self._masks.get(radius)
+        if masks is None:
+            values = [0]
+            for bits in range(1, radius + 1):
+                for positions in itertools.combinations(range(self.chunk_bits), bits):
+                    values.append(sum(1 << p for p in positions))
+            masks = self._masks[radius] = np.array(values, dtype=np.uint32)
+        return masks
+
+    def _on_add(self, row):
+        if self._size - self._indexed > max(256, int(self._indexed * self.reindex_fraction)):
+            self._rebuild()
+
+    def _rebuild(self):
+        rows = self._alive_rows()
+        values = self._chunk_values(self._templates[rows])
+        order = np.argsort(values, axis=0, kind="stable")
+        self._sorted_values = np.take_along_axis(values, order, axis=0).T.copy()
+        self._sorted_rows = rows[order].T.copy()
+        self._indexed = self._size
+
+    def _copy_structure(self):
+        self._masks = dict(self._masks)
+
+    def _structure_arrays(self):
+        return {
+            "mih_chunks": np.array(self.chunks),
+            "mih_indexed": np.array(self._indexed),
+            "mih_sorted_values": self._sorted_values,
+            "mih_sorted_rows": self._sorted_rows,
+        }
+
+    def _load_structure(self, arrays):
+        self.chunks = int(arrays["mih_chunks"])
+        self.chunk_bits = HASH_BYTES * 8 // self.chunks
+        self.reindex_fraction = 0.05
+        self.max_chunk_radius = 4
+        self._indexed = int(arrays["mih_indexed"])
+        self._sorted_values = arrays["mih_sorted_values"].copy()
+        self._sorted_rows = arrays["mih_sorted_rows"].copy()
+        self._masks = {}
+
+    def _candidates(self, probe_values, radius):
+        found = [np.arange(self._indexed, self._size)]  # Unsorted tail is always scanned
+        masks = self._flip_masks(radius)
+        for chunk in range(self.chunks):
+            table = self._sorted_values[chunk]
+            values = probe_values[chunk] ^ masks
+            lo = np.searchsorted(table, values, side="left")
+            hi = np.searchsorted(table, values, side="right")
+            hit = hi > lo
+            for start, end in zip(lo[hit], hi[hit]):
+                found.append(self._sorted_rows[chunk, start:end])
+        rows = np.unique(np.concatenate(found))
+        return rows[self._alive[rows]]
+
+    def search(self, probes, k=1, max_distance=None):
+        probes = np.asarray(probes, dtype=np.uint8).reshape(-1, HASH_BYTES)
+        all_values = self._chunk_values(probes)
+        results = []
+        for probe, probe_values in zip(probes, all_values):
+            if max_distance is not None:
+                radius = max_distance // self.chunks
+            else:
+                radius = 0
+            while True:
+                # Everything within `complete` bits of the probe is guaranteed to be a candidate
+                complete = self.chunks * (radius + 1) - 1
+                if radius > self.max_chunk_radius:
+                    rows = self._alive_rows()
+                    distances = hamming_distances(probe, self._templates[rows])
+                    results.append(self._results(rows, distances, k, max_distance))
+                    break
+                rows = self._candidates(probe_values, radius)
+                distances = hamming_distances(probe, self._templates[rows])
+                if max_distance is not None:
+                    results.append(self._results(rows, distances, k, max_distance))
+                    break
+                if np.count_nonzero(distances <= complete) >= min(k, len(self)):
+                    results.append(self._results(rows, distances, k, complete))
+                    break
+                radius += 1
+        return results
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_attached = {}  # In pool workers: shared memory name -> (SharedMemory, templates array)
+
+
+def _match_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the GUI and ingest processes are multi-threaded
+            _pool = ProcessPoolExecutor(max_workers=Config.MATCH_WORKERS or os.cpu_count() or 1,
+                                        mp_context=multiprocessing.get_context("spawn"))
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+def _release_shared(shm):
+    shm.close()
+    shm.unlink()
+
+
+class _SharedTemplates:
+    """Live templates of a ShardedIndex copied into one shared memory block for the pool."""
+
+    def __init__(self, templates, rows):
+        self.rows = rows  # Shared position -> index row
+        self.count = len(templates)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, templates.nbytes))
+        np.ndarray(templates.shape, dtype=np.uint8, buffer=self.shm.buf)[:] = templates
+        # Unlinked once the index that published it is dropped (or at exit)
+        weakref.finalize(self, _release_shared, self.shm)
+
+
+def _shard_top_k(name, count, start, end, probes, k):
+    # Runs in a pool worker: attach to the templates once per block, match one shard
+    entry = _attached.get(name)
+    if entry is None:
+        for old_shm, _ in _attached.values():
+            old_shm.close()  # The parent has moved on to a newer block
+        _attached.clear()
+        shm = shared_memory.SharedMemory(name=name)
+        entry = _attached[name] = (shm, np.ndarray((count, HASH_BYTES), dtype=np.uint8, buffer=shm.buf))
+    indices, distances = top_k_hamming(probes, entry[1][start:end], k)
+    return indices + start, distances
+
+
+class ShardedIndex(BruteForceIndex):
+    """Exact search split across a process pool, for enrollments too big for one core.
+
+    Live templates are published once into shared memory; each search sends only the probes
+    to Config.MATCH_WORKERS processes, each of which scans one shard, and the per-shard top-k
+    lists are merged here. Below min_parallel templates the IPC costs more than it saves and
+    the search runs in-process like BruteForceIndex.
+    """
+
+    kind = "sharded"
+
+    def __init__(self, min_parallel=Config.MATCH_PARALLEL_MIN_TEMPLATES):
+        super().__init__()
+        self.min_parallel = min_parallel
+        self._shared = None
+        self._shared_lock = threading.Lock()
+
+    def search(self, probes, k=1, max_distance=None):
+        probes = np.asarray(probes, dtype=np.uint8).reshape(-1, HASH_BYTES)
+        if len(self) < self.min_parallel or not len(probes):
+            return super().search(probes, k, max_distance)
+
+        shared = self._publish()
+        shards = min(Config.MATCH_WORKERS or os.cpu_count() or 1, shared.count)
+        bounds = np.linspace(0, shared.count, shards + 1).astype(int)
+        futures = [_match_pool().submit(_shard_top_k, shared.shm.name, shared.count, start, end, probes, k)
+                   for start, end in zip(bounds[:-1], bounds[1:])]
+        parts = [future.result() for future in futures]
+
+        # Merge: each probe's candidates from every shard, nearest k overall
+        indices = np.concatenate([part[0] for part in parts], axis=1)
+        distances = np.concatenate([part[1] for part in parts], axis=1)
+        order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        indices = np.take_along_axis(indices, order, axis=1)
+        distances = np.take_along_axis(distances, order, axis=1)
+        return [self._results(shared.rows[row_indices], row_distances, k, max_distance)
+                for row_indices, row_distances in zip(indices, distances)]
+
+    def _publish(self):
+        with self._shared_lock:
+            if self._shared is None:
+                rows = self._alive_rows()
+                self._shared = _SharedTemplates(self._templates[rows], rows)
+            return self._shared
+
+    def _on_add(self, row):
+        self._shared = None
+
+    def _on_remove(self, row):
+        self._shared = None
+
+    def _rebuild(self):
+        self._shared = None
+
+    def _copy_structure(self):
+        self._shared = None
+        self._shared_lock = threading.Lock()
+
+    def _load_structure(self, arrays):
+        self.min_parallel = Config.MATCH_PARALLEL_MIN_TEMPLATES
+        self._shared = None
+        self._shared_lock = threading.Lock()
+
+
+INDEX_TYPES = {
+    BruteForceIndex.kind: BruteForceIndex,
+    MultiIndexHashIndex.kind: MultiIndexHashIndex,
+    ShardedIndex.kind: ShardedIndex,
+}
+
+
+def create_index(kind=Config.FACE_INDEX_BACKEND):
+    return INDEX_TYPES[kind]()
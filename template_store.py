@@ -0,0 +1,195 @@
+import os
+import numpy as np
+from config import Config
+from template_index import HASH_BYTES
+
+# Flat, versioned file of enrolled face templates that every process maps with np.memmap,
+# so workers share one page-cached copy and start without reading templates from SQLite.
+#
+# Layout: a HEADER_SIZE header, then fixed-size records (students.id, template, alive).
+# Changes are append-only: a new or changed template is appended and the record it
+# replaces is tombstoned in place, so a record's template bytes are never rewritten under
+# a reader. compact() writes the live records to a new file and swaps it in; readers keep
+# the old mapping until they reopen.
+
+MAGIC = b"FACETPL1"
+FORMAT_VERSION = 1
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'),
+    ('format', '<u4'),
+    ('record_size', '<u4'),
+    ('revision', '<u8'),  # students revision (see migrations.students_revision) the file reflects
+    ('database_id', 'S16'),  # Ties the file to one database, revisions alone could collide
+    ('model', 'S32'),  # TEMPLATE_MODEL of every record
+    ('reserved', 'u1', (56,)),
+])
+HEADER_SIZE = HEADER_DTYPE.itemsize  # 128
+RECORD_DTYPE = np.dtype([
+    ('id', '<i8'),
+    ('template', 'u1', (HASH_BYTES,)),
+    ('alive', 'u1'),
+    ('reserved', 'u1', (7,)),
+])
+_ALIVE_OFFSET = RECORD_DTYPE.fields['alive'][1]
+
+
+class TemplateStore:
+    """Memory-mapped, append-only template file for one database and template model."""
+
+    def __init__(self, path, model, compact_fraction=Config.TEMPLATE_STORE_COMPACT_FRACTION):
+        self.path = path
+        self.model = model
+        self.compact_fraction = compact_fraction  # Compact once this share of records is dead
+        self.revision = None
+        self.database_id = None
+        self.records = np.empty(0, dtype=RECORD_DTYPE)
+        self._stat = None
+
+    def open(self):
+        """Map the file, or remap it if another process changed it; returns True if remapped."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._reset()
+            return False
+        key = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if key == self._stat:
+            return False
+
+        header = self._read_header()
+        if header is None:
+            self._reset()
+            return False
+        count = (stat.st_size - HEADER_SIZE) // RECORD_DTYPE.itemsize  # A torn append is ignored
+        if count:
+            self.records = np.memmap(self.path, dtype=RECORD_DTYPE, mode='r', offset=HEADER_SIZE, shape=(count,))
+        else:
+            self.records = np.empty(0, dtype=RECORD_DTYPE)
+        self.revision = int(header['revision'])
+        self.database_id = header['database_id'].decode()
+        self._stat = key
+        return True
+
+    def live(self):
+        """(ids, templates, alive): record arrays plus the mask of current records.
+
+        templates is a view into the mapping, not a copy. If an id has several live records
+        (a reader caught an update half way) only the last one counts.
+        """
+        ids = self.records['id']
+        alive = self.records['alive'] == 1
+        rows = np.flatnonzero(alive)
+        _, last = np.unique(ids[rows][::-1], return_index=True)
+        alive[:] = False
+        alive[rows[len(rows) - 1 - last]] = True
+        return ids, self.records['template'], alive
+
+    def sync(self, revision, database_id, templates):
+        """Write templates ((id, template_bytes) pairs) as the contents for revision.
+
+        Callers serialize writers (Database.sync_template_store holds the database write lock).
+        """
+        self.open()
+        templates = dict(templates)
+        if self.revision is None or self.database_id != database_id:
+            self._rewrite(revision, database_id, list(templates.items()))
+            return
+
+        ids, current, alive = self.live()
+        tombstones = []
+        for row in np.flatnonzero(alive):
+            student_row_id = int(ids[row])
+            template = templates.get(student_row_id)
+            if template is not None and current[row].tobytes() == template:
+                del templates[student_row_id]  # Unchanged
+            else:
+                tombstones.append(row)
+
+        dead = len(self.records) - np.count_nonzero(alive) + len(tombstones)
+        if dead + len(templates) and dead > self.compact_fraction * (len(self.records) + len(templates)):
+            alive[tombstones] = False
+            kept = [(int(ids[row]), current[row].tobytes()) for row in np.flatnonzero(alive)]
+            self._rewrite(revision, database_id, kept + list(templates.items()))
+            return
+
+        with open(self.path, 'r+b') as f:
+            if templates:
+                # Append first, then tombstone: readers may briefly see both, never neither
+                f.seek(HEADER_SIZE + len(self.records) * RECORD_DTYPE.itemsize)
+                f.write(self._records(templates.items()).tobytes())
+            for row in tombstones:
+                f.seek(HEADER_SIZE + int(row) * RECORD_DTYPE.itemsize + _ALIVE_OFFSET)
+                f.write(b"\0")
+            f.seek(HEADER_DTYPE.fields['revision'][1])
+            f.write(np.array(revision, dtype='<u8').tobytes())
+        self._stat = None
+        self.open()
+
+    def compact(self):
+        """Rewrite the file with only its live records; call under the same lock as sync()."""
+        self.open()
+        if self.revision is None:
+            return
+        ids, current, alive = self.live()
+        self._rewrite(self.revision, self.database_id,
+                      [(int(ids[row]), current[row].tobytes()) for row in np.flatnonzero(alive)])
+
+    def _rewrite(self, revision, database_id, templates):
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header['magic'] = MAGIC
+        header['format'] = FORMAT_VERSION
+        header['record_size'] = RECORD_DTYPE.itemsize
+        header['revision'] = revision
+        header['database_id'] = database_id.encode()
+        header['model'] = self.model.encode()
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(header.tobytes())
+            f.write(self._records(templates).tobytes())
+        os.replace(temp_path, self.path)
+        self._stat = None
+        self.open()
+
+    def _records(self, templates):
+        templates = list(templates)
+        records = np.zeros(len(templates), dtype=RECORD_DTYPE)
+        if templates:
+            records['id'] = [student_row_id for student_row_id, _ in templates]
+            records['template'] = np.frombuffer(b"".join(template for _, template in templates),
+                                                dtype=np.uint8).reshape(-1, HASH_BYTES)
+            records['alive'] = 1
+        return records
+
+    def _read_header(self):
+        try:
+            header = np.fromfile(self.path, dtype=HEADER_DTYPE, count=1)
+        except (OSError, ValueError):
+            return None
+        if (len(header) != 1 or header['magic'][0] != MAGIC or header['format'][0] != FORMAT_VERSION
+                or header['record_size'][0] != RECORD_DTYPE.itemsize or header['model'][0].decode() != self.model):
+            return None  # Other format or template model: rebuilt on the next sync
+        return header[0]
+
+    def _reset(self):
+        self.revision = None
+        self.database_id = None
+        self.records = np.empty(0, dtype=RECORD_DTYPE)
+        self._stat = None
+
+
+if __name__ == '__main__':
+    import argparse
+    from database import Database
+    from face_index import TEMPLATE_MODEL
+
+    parser = argparse.ArgumentParser(description="Sync or compact the memory-mapped face template store")
+    parser.add_argument("--db", default="attendance_system.db", help="Path to the SQLite database")
+    parser.add_argument("--compact", action="store_true", help="Drop tombstoned records")
+    args = parser.parse_args()
+
+    db = Database(args.db)
+    store = TemplateStore(db.template_store_path(), TEMPLATE_MODEL)
+    db.sync_template_store(store, compact=args.compact)
+    _, _, alive = store.live()
+    print(f"{store.path}: revision {store.revision}, {np.count_nonzero(alive)} live of {len(store.records)} records")
+    db.close()